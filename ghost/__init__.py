@@ -1,9 +1,49 @@
 # -*- coding: utf-8 -*-
-from .ghost import (
-    Ghost,
-    Error,
-    Session,
-    TimeoutError,
-    __version__,
-)
-from .test import GhostTestCase
+import sys as _sys
+from importlib import import_module as _import_module
+
+# Maps public names to the submodule defining them
+_EXPORTS = {
+    'Ghost': 'ghost',
+    'Error': 'ghost',
+    'Session': 'ghost',
+    'StaleElementError': 'ghost',
+    'TimeoutError': 'ghost',
+    '__version__': 'ghost',
+    'DisplayPool': 'pool',
+    'GhostPool': 'pool',
+    'SessionPool': 'pool',
+    'GhostTestCase': 'test',
+}
+
+# Submodules reachable as attributes, e.g. `ghost.ghost`
+_SUBMODULES = ('bindings', 'ghost', 'pool', 'test', 'visual')
+
+__all__ = sorted(_EXPORTS)
+
+
+def _resolve(name):
+    """Imports `name` from its submodule, Qt bindings are loaded by then."""
+    if name in _SUBMODULES:
+        return _import_module('.%s' % name, __name__)
+    try:
+        module = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(
+            "module %r has no attribute %r" % (__name__, name))
+
+    value = getattr(_import_module('.%s' % module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+if _sys.version_info >= (3, 7):
+    # Only import Qt bindings when they are actually needed
+    def __getattr__(name):
+        return _resolve(name)
+
+    def __dir__():
+        return sorted(set(globals()) | set(_EXPORTS) | set(_SUBMODULES))
+else:
+    for _name in _EXPORTS:
+        _resolve(_name)
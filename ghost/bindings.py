@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 
 
 def _load_binding():
@@ -33,9 +34,16 @@ class LazyBinding(object):
         def __getattr__(self, name):
             return self.__class__
 
+    def __init__(self, *args, **kwargs):
+        pass
+
     def __getattr__(self, name):
         return self.__class__
 
+    def __call__(self, func, *args, **kwargs):
+        # Pass-through when used as a decorator, e.g. Slot(str)(method)
+        return func
+
 
 def _import(name):
     if BINDING is None:
@@ -48,48 +56,77 @@ def _import(name):
     return module
 
 
-QtCore = _import("QtCore")
-QSize = QtCore.QSize
-QByteArray = QtCore.QByteArray
-QUrl = QtCore.QUrl
-QDateTime = QtCore.QDateTime
-QtCriticalMsg = QtCore.QtCriticalMsg
-QtDebugMsg = QtCore.QtDebugMsg
-QtFatalMsg = QtCore.QtFatalMsg
-QtWarningMsg = QtCore.QtWarningMsg
+_MODULES = ["QtCore", "QtGui", "QtNetwork", "QtWebKit"]
 if BINDING_NAME == "PyQt5":
-    qInstallMsgHandler = QtCore.qInstallMessageHandler
-else:
-    qInstallMsgHandler = QtCore.qInstallMsgHandler
-
-QtGui = _import("QtGui")
-QImage = QtGui.QImage
-QPainter = QtGui.QPainter
-QRegion = QtGui.QRegion
+    _MODULES += ["QtWidgets", "QtPrintSupport", "QtWebKitWidgets"]
+
+# Maps class aliases to (module, attribute name)
+_ALIASES = {
+    "QSize": ("QtCore", "QSize"),
+    "QByteArray": ("QtCore", "QByteArray"),
+    "QUrl": ("QtCore", "QUrl"),
+    "QDateTime": ("QtCore", "QDateTime"),
+    "QtCriticalMsg": ("QtCore", "QtCriticalMsg"),
+    "QtDebugMsg": ("QtCore", "QtDebugMsg"),
+    "QtFatalMsg": ("QtCore", "QtFatalMsg"),
+    "QtWarningMsg": ("QtCore", "QtWarningMsg"),
+    "QObject": ("QtCore", "QObject"),
+    "QImage": ("QtGui", "QImage"),
+    "QPainter": ("QtGui", "QPainter"),
+    "QRegion": ("QtGui", "QRegion"),
+    "QNetworkRequest": ("QtNetwork", "QNetworkRequest"),
+    "QNetworkAccessManager": ("QtNetwork", "QNetworkAccessManager"),
+    "QNetworkCookieJar": ("QtNetwork", "QNetworkCookieJar"),
+    "QNetworkDiskCache": ("QtNetwork", "QNetworkDiskCache"),
+    "QNetworkProxy": ("QtNetwork", "QNetworkProxy"),
+    "QNetworkCookie": ("QtNetwork", "QNetworkCookie"),
+    "QSslConfiguration": ("QtNetwork", "QSslConfiguration"),
+    "QSsl": ("QtNetwork", "QSsl"),
+}
 if BINDING_NAME == "PyQt5":
-    QtWidgets = _import("QtWidgets")
-    QtPrintSupport = _import("QtPrintSupport")
-    QApplication = QtWidgets.QApplication
-    QPrinter = QtPrintSupport.QPrinter
+    _ALIASES.update({
+        "qInstallMsgHandler": ("QtCore", "qInstallMessageHandler"),
+        "Slot": ("QtCore", "pyqtSlot"),
+        "QApplication": ("QtWidgets", "QApplication"),
+        "QPrinter": ("QtPrintSupport", "QPrinter"),
+        "QWebPage": ("QtWebKitWidgets", "QWebPage"),
+        "QWebView": ("QtWebKitWidgets", "QWebView"),
+    })
 else:
-    QApplication = QtGui.QApplication
-    QPrinter = QtGui.QPrinter
-
-QtNetwork = _import("QtNetwork")
-QNetworkRequest = QtNetwork.QNetworkRequest
-QNetworkAccessManager = QtNetwork.QNetworkAccessManager
-QNetworkCookieJar = QtNetwork.QNetworkCookieJar
-QNetworkDiskCache = QtNetwork.QNetworkDiskCache
-QNetworkProxy = QtNetwork.QNetworkProxy
-QNetworkCookie = QtNetwork.QNetworkCookie
-QSslConfiguration = QtNetwork.QSslConfiguration
-QSsl = QtNetwork.QSsl
-
-QtWebKit = _import('QtWebKit')
-if BINDING_NAME == "PyQt5":
-    QtWebKitWidgets = _import("QtWebKitWidgets")
-    QWebPage = QtWebKitWidgets.QWebPage
-    QWebView = QtWebKitWidgets.QWebView
+    _ALIASES.update({
+        "qInstallMsgHandler": ("QtCore", "qInstallMsgHandler"),
+        "Slot": ("QtCore", "Slot" if BINDING_NAME == "PySide" else "pyqtSlot"),
+        "QApplication": ("QtGui", "QApplication"),
+        "QPrinter": ("QtGui", "QPrinter"),
+        "QWebPage": ("QtWebKit", "QWebPage"),
+        "QWebView": ("QtWebKit", "QWebView"),
+    })
+
+
+def _resolve(name):
+    """Imports binding module or class alias `name` and caches it as a
+    module global so that next lookups do not go through here.
+    """
+    if name in _MODULES:
+        value = _import(name)
+    elif name in _ALIASES:
+        module, attribute = _ALIASES[name]
+        value = getattr(_resolve(module), attribute)
+    else:
+        raise AttributeError(
+            "module %r has no attribute %r" % (__name__, name))
+
+    globals()[name] = value
+    return value
+
+
+if sys.version_info >= (3, 7):
+    # Qt modules are slow to import, only pay for them on first use
+    def __getattr__(name):
+        return _resolve(name)
+
+    def __dir__():
+        return sorted(set(globals()) | set(_MODULES) | set(_ALIASES))
 else:
-    QWebPage = QtWebKit.QWebPage
-    QWebView = QtWebKit.QWebView
+    for _name in _MODULES + list(_ALIASES):
+        _resolve(_name)
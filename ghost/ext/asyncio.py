@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""asyncio integration for Ghost.py sessions (requires python 3.5+).
+
+.. code:: python
+
+    from ghost import Ghost
+    from ghost.ext.asyncio import AsyncSession
+
+    async def main(ghost):
+        async with AsyncSession(ghost.start()) as session:
+            page, resources = await session.open('http://jeanphix.me')
+            await session.wait_for_selector('h1')
+"""
+from __future__ import absolute_import
+
+import asyncio
+import time
+
+from ghost.ghost import Session, TimeoutError
+
+
+def _can_load_page(name):
+    """Builds a coroutine proxying `Session` method `name` that waits for
+    page loading without blocking the event loop when `expect_loading` is
+    set to True.
+    """
+    async def method(self, *args, **kwargs):
+        expect_loading = kwargs.pop('expect_loading', False)
+        func = getattr(self.session, name)
+
+        if expect_loading:
+            timeout = kwargs.pop('timeout', None)
+            self.session.loaded = False
+            func(*args, **kwargs)
+            return await self.wait_for_page_loaded(timeout=timeout)
+        return func(*args, **kwargs)
+
+    method.__name__ = name
+    method.__doc__ = getattr(Session, name).__doc__
+    return method
+
+
+class AsyncSession(object):
+    """Drives a `Session` from an asyncio event loop.
+
+    Qt events are processed between two condition checks, then control is
+    given back to the event loop. Thus, many `AsyncSession` sharing the same
+    `Ghost` instance make progress concurrently. Methods that do not wait
+    are proxied to the underlying session.
+
+    :param session: The `Session` to drive.
+    :param poll_interval: Delay in seconds between two condition checks.
+    """
+    def __init__(self, session, poll_interval=0.01):
+        self.session = session
+        self.poll_interval = poll_interval
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    call = _can_load_page('call')
+    click = _can_load_page('click')
+    evaluate = _can_load_page('evaluate')
+    fill = _can_load_page('fill')
+    fire = _can_load_page('fire')
+    set_field_value = _can_load_page('set_field_value')
+
+    async def open(self, address, timeout=None, **kwargs):
+        """Opens a web page, see `Session.open`.
+
+        :param address: The resource URL.
+        :param timeout: An optional timeout.
+        :return: Page resource, and all loaded resources.
+        """
+        kwargs['wait'] = False
+        self.session.open(address, **kwargs)
+        return await self.wait_for_page_loaded(timeout=timeout)
+
+    async def sleep(self, value=0.1):
+        """Processes Qt events during `value` seconds."""
+        started_at = time.time()
+
+        while time.time() <= (started_at + value):
+            self.session.ghost.app.processEvents()
+            await asyncio.sleep(self.poll_interval)
+
+    async def wait_for(self, condition, timeout_message, timeout=None):
+        """Waits until condition is True.
+
+        :param condition: A callable that returns the condition.
+        :param timeout_message: The exception message on timeout.
+        :param timeout: An optional timeout.
+        """
+        session = self.session
+        timeout = session.wait_timeout if timeout is None else timeout
+        started_at = time.time()
+
+        while True:
+            session.ghost.app.processEvents()
+            if condition():
+                return
+            if time.time() > (started_at + timeout):
+                session.logger.debug(
+                    'Timeout with %d requests still in flight',
+                    session.manager.requests,
+                )
+                raise TimeoutError(timeout_message)
+            await asyncio.sleep(self.poll_interval)
+            if session.wait_callback is not None:
+                session.wait_callback()
+
+    async def wait_for_alert(self, timeout=None):
+        """Waits for main frame alert().
+
+        :param timeout: An optional timeout.
+        """
+        session = self.session
+        await self.wait_for(lambda: session._alert is not None,
+                            'User has not been alerted.', timeout)
+        msg = session._alert
+        session._alert = None
+        return msg, session._release_last_resources()
+
+    async def wait_for_page_loaded(self, timeout=None):
+        """Waits until page is loaded, assumed that a page as been requested.
+
+        :param timeout: An optional timeout.
+        """
+        await self.wait_for(self.session._is_loaded,
+                            'Unable to load requested page', timeout)
+        return self.session._loaded_page()
+
+    async def wait_for_selector(self, selector, timeout=None):
+        """Waits until selector match an element on the frame.
+
+        :param selector: The selector to wait for.
+        :param timeout: An optional timeout.
+        """
+        await self.wait_for(
+            lambda: self.session.exists(selector),
+            'Can\'t find element matching "%s"' % selector,
+            timeout,
+        )
+        return True, self.session._release_last_resources()
+
+    async def wait_while_selector(self, selector, timeout=None):
+        """Waits until the selector no longer matches an element on the frame.
+
+        :param selector: The selector to wait for.
+        :param timeout: An optional timeout.
+        """
+        await self.wait_for(
+            lambda: not self.session.exists(selector),
+            'Element matching "%s" is still available' % selector,
+            timeout,
+        )
+        return True, self.session._release_last_resources()
+
+    async def wait_for_text(self, text, timeout=None):
+        """Waits until given text appear on main frame.
+
+        :param text: The text to wait for.
+        :param timeout: An optional timeout.
+        """
+        await self.wait_for(
+            lambda: text in self.session.content,
+            'Can\'t find "%s" in current frame' % text,
+            timeout,
+        )
+        return True, self.session._release_last_resources()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.session.exit()
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import codecs
+import json
 import logging
 import os
 import re
@@ -8,6 +9,7 @@ import time
 import uuid
 from contextlib import contextmanager
 from functools import partial, wraps
+from multiprocessing.pool import ThreadPool
 
 from xvfbwrapper import Xvfb
 
@@ -22,6 +24,7 @@ from .bindings import (
     QNetworkDiskCache,
     QNetworkProxy,
     QNetworkRequest,
+    QObject,
     QPainter,
     QPrinter,
     QRegion,
@@ -39,6 +42,7 @@ from .bindings import (
     QWebPage,
     QUrl,
     BINDING,
+    Slot,
     qInstallMsgHandler,
 )
 
@@ -62,6 +66,328 @@ default_user_agent = (
     "Chrome/57.0.2987.133 Safari/537.36"
 )
 
+# Version of the helper library, bump it on any change so that pages keeping
+# an older library get the new one injected.
+_helpers_version = 7
+
+# Helper library injected in every frame on window object creation, Session
+# methods invoke its functions by name with JSON encoded arguments instead
+# of building and compiling a new script for each call.
+_helpers_script = """
+(function (window, document) {
+    if (window.__ghost && window.__ghost.version === %d) {
+        return;
+    }
+
+    function fire(element, name) {
+        var event = document.createEvent('HTMLEvents');
+        event.initEvent(name, true, true);
+        return element.dispatchEvent(event);
+    }
+
+    function click(element, button) {
+        var event = document.createEvent('MouseEvents');
+        event.initMouseEvent('click', true, true, window, 1, 1, 1, 1, 1,
+            false, false, false, false, button, element);
+        return element.dispatchEvent(event);
+    }
+
+    // Counts DOM mutations so that Python can tell when serialized content
+    // is outdated, the token tells documents apart. Observing only starts
+    // on first use so that pages never read don't pay for it.
+    var Observer = window.MutationObserver || window.WebKitMutationObserver,
+        observer = null,
+        token = null,
+        generation = 0;
+
+    window.__ghost = {
+        version: %d,
+
+        // Returns a key that changes whenever the DOM is mutated, or null
+        // when mutations can't be observed.
+        generation: function () {
+            if (!Observer) {
+                return null;
+            }
+            if (!observer) {
+                observer = new Observer(function () {
+                    generation++;
+                });
+                observer.observe(document, {
+                    attributes: true,
+                    characterData: true,
+                    childList: true,
+                    subtree: true
+                });
+                // Earlier mutations are unknown, start a new generation
+                token = Math.random().toString(36).slice(2);
+            } else if (observer.takeRecords().length) {
+                // Records not delivered yet to the callback
+                generation++;
+            }
+            return token + ':' + generation;
+        },
+
+        invoke: function (name, args) {
+            return this[name].apply(this, args);
+        },
+
+        call: function (selector, method) {
+            var element = document.querySelector(selector);
+            return element ? element[method]() : undefined;
+        },
+
+        callElement: function (element, method) {
+            return element[method]();
+        },
+
+        click: function (selector, button) {
+            return click(document.querySelector(selector), button);
+        },
+
+        clickElement: click,
+
+        fire: function (selector, name) {
+            var element = document.querySelector(selector);
+            return element ? fire(element, name) : undefined;
+        },
+
+        fireElement: fire,
+
+        globalExists: function (name) {
+            return typeof window[name] !== 'undefined';
+        },
+
+        // Extracts fields of elements matched by each spec selector
+        extract: function (spec) {
+            var result = {};
+
+            function value(element, field) {
+                if (typeof field !== 'string') {
+                    element = element.querySelector(field[0]);
+                    field = field[1];
+                }
+                if (!element) {
+                    return null;
+                }
+                switch (field.charAt(0)) {
+                case '@':
+                    return element.getAttribute(field.slice(1));
+                case '.':
+                    return element[field.slice(1)];
+                }
+                return field === 'html' ? element.innerHTML :
+                    element.textContent.trim();
+            }
+
+            for (var name in spec) {
+                if (!spec.hasOwnProperty(name)) {
+                    continue;
+                }
+                var elements = document.querySelectorAll(spec[name].selector),
+                    fields = spec[name].fields,
+                    records = result[name] = [];
+
+                for (var i = 0; i < elements.length; i++) {
+                    var record = {};
+                    for (var key in fields) {
+                        if (fields.hasOwnProperty(key)) {
+                            record[key] = value(elements[i], fields[key]);
+                        }
+                    }
+                    records.push(record);
+                }
+            }
+            return result;
+        },
+
+        // Returns the text of the element most likely holding the main
+        // content: a single article or main element, else the element
+        // whose paragraphs hold the most text, penalized by link density.
+        readable: function () {
+            var landmarks = document.querySelectorAll(
+                    'article, main, [role="main"]'),
+                blocks = document.querySelectorAll('p, pre, blockquote'),
+                nodes = [],
+                scores = [],
+                best = document.body,
+                bestScore = 0;
+
+            function text(element) {
+                return (element.innerText || element.textContent || '')
+                    .trim();
+            }
+
+            function add(element, score) {
+                if (!element || element === document.documentElement) {
+                    return;
+                }
+                var index = nodes.indexOf(element);
+                if (index === -1) {
+                    nodes.push(element);
+                    scores.push(score);
+                } else {
+                    scores[index] += score;
+                }
+            }
+
+            if (landmarks.length === 1) {
+                best = landmarks[0];
+            } else {
+                for (var i = 0; i < blocks.length; i++) {
+                    var length = text(blocks[i]).length;
+                    if (length >= 25) {
+                        add(blocks[i].parentNode, length);
+                        add(blocks[i].parentNode.parentNode, length / 2);
+                    }
+                }
+                for (i = 0; i < nodes.length; i++) {
+                    var links = nodes[i].querySelectorAll('a'),
+                        linkLength = 0;
+                    for (var j = 0; j < links.length; j++) {
+                        linkLength += text(links[j]).length;
+                    }
+                    var score = scores[i] * (1 - linkLength /
+                        Math.max(text(nodes[i]).length, 1));
+                    if (score > bestScore) {
+                        best = nodes[i];
+                        bestScore = score;
+                    }
+                }
+            }
+            return best ? text(best) : '';
+        },
+
+        // Sends `items` to Python handlers of `channel` in batches of
+        // `batchSize`, `map` builds records one batch at a time.
+        send: function (channel, items, batchSize, map) {
+            var length = items.length,
+                batch;
+            batchSize = batchSize || 1000;
+            for (var start = 0; start < length; start += batchSize) {
+                batch = Array.prototype.slice.call(
+                    items, start, start + batchSize);
+                window.__ghostBridge.send(channel, map ? batch.map(map) :
+                                                         batch);
+            }
+            return length;
+        },
+
+        // Sets form fields values and dispatches their events, file fields
+        // are reported back as they can't be set from scripts.
+        fillForm: function (selector, values, blur) {
+            var form = document.querySelector(selector),
+                fields = form.querySelectorAll('[name]'),
+                groups = {},
+                result = {missing: [], files: [], unsupported: []},
+                textTypes = [
+                    'color', 'date', 'datetime', 'datetime-local', 'email',
+                    'hidden', 'month', 'number', 'password', 'range',
+                    'search', 'tel', 'text', 'time', 'url', 'week', ''
+                ];
+
+            function check(element, checked) {
+                element.focus();
+                if (checked) {
+                    element.setAttribute('checked', 'checked');
+                } else {
+                    element.removeAttribute('checked');
+                }
+                element.checked = checked;
+            }
+
+            for (var i = 0; i < fields.length; i++) {
+                var name = fields[i].getAttribute('name');
+                (groups[name] = groups[name] || []).push(fields[i]);
+            }
+
+            for (name in values) {
+                if (!values.hasOwnProperty(name)) {
+                    continue;
+                }
+                var value = values[name],
+                    group = groups[name],
+                    element = group && group[0];
+
+                if (!element) {
+                    result.missing.push(name);
+                    continue;
+                }
+
+                var tagName = element.tagName.toLowerCase(),
+                    type = (element.getAttribute('type') || '').toLowerCase();
+
+                if (tagName === 'select') {
+                    element.focus();
+                    for (var j = 0; j < element.options.length; j++) {
+                        if (element.options[j].value === value) {
+                            element.options[j].selected = true;
+                            element.selectedIndex = j;
+                            break;
+                        }
+                    }
+                } else if (tagName === 'textarea') {
+                    element.focus();
+                    element.value = value;
+                } else if (tagName !== 'input') {
+                    result.unsupported.push(name);
+                    continue;
+                } else if (textTypes.indexOf(type) !== -1) {
+                    element.focus();
+                    element.setAttribute('value', value);
+                    element.value = value;
+                } else if (type === 'checkbox') {
+                    for (j = 0; j < group.length; j++) {
+                        check(group[j], group.length > 1 ?
+                            group[j].value === value : value === true);
+                    }
+                } else if (type === 'radio') {
+                    for (j = 0; j < group.length; j++) {
+                        if (group[j].value === value) {
+                            check(group[j], true);
+                        }
+                    }
+                } else if (type === 'file') {
+                    result.files.push(name);
+                    continue;
+                }
+
+                fire(element, 'input');
+                fire(element, 'change');
+                if (blur) {
+                    element.blur();
+                }
+            }
+            return result;
+        }
+    };
+})(window, document);
+""" % (_helpers_version, _helpers_version)
+
+# Invokes a helper, wrapping its result so that a missing library (null) can
+# be told apart from an undefined result ([undefined]) and from an exception
+# ({error: message}). `this` is kept for element invocations.
+_invoke_script = (
+    "(function () {"
+    " if (!window.__ghost || __ghost.version !== %d) { return null; }"
+    " try { return [__ghost.invoke(%%s, %%s)]; }"
+    " catch (e) { return {error: String(e)}; }"
+    " }).call(this);" % _helpers_version
+)
+
+# Evaluated on an element, tells whether it still belongs to its frame
+# document, null when javascript is disabled or the document is gone.
+_attached_script = (
+    "this.ownerDocument === document &&"
+    " document.documentElement.contains(this);"
+)
+
+# Returns current DOM generation without logging when the library is missing,
+# content is then serialized on each access.
+_generation_script = (
+    "window.__ghost && __ghost.generation ? __ghost.generation() : null;"
+)
+
 logger = logging.getLogger('ghost')
 logger.addHandler(logging.NullHandler())
 
@@ -76,6 +402,12 @@ class TimeoutError(Error):
     pass
 
 
+class StaleElementError(Error):
+    """Raised when an element handle is used after its element left the
+    document"""
+    pass
+
+
 class QTMessageProxy(object):
     def __init__(self, logger):
         self.logger = logger
@@ -183,6 +515,32 @@ class GhostWebPage(QWebPage):
         return self.user_agent
 
 
+class DataBridge(QObject):
+    """Exposed to page scripts as `__ghostBridge`, receives batches of
+    records sent through `__ghost.send()` and dispatches them to the
+    session handlers of their channel.
+
+    :param session: The parent `Session` instance.
+    """
+    def __init__(self, session):
+        self.session = session
+        self.handlers = {}
+        super(DataBridge, self).__init__()
+
+    @Slot(str, 'QVariant')
+    def send(self, channel, records):
+        handler = self.handlers.get(channel)
+        if handler is None:
+            self.session.logger.warning('No handler for channel %s', channel)
+            return
+        # Exceptions must not propagate back to Qt
+        try:
+            handler(records)
+        except Exception:
+            self.session.logger.exception('Handler for channel %s failed',
+                                          channel)
+
+
 def can_load_page(func):
     """Decorator that specifies if user can expect page loading from
     this action. If expect_loading is set to True, ghost will wait
@@ -193,14 +551,124 @@ def can_load_page(func):
         expect_loading = kwargs.pop('expect_loading', False)
 
         if expect_loading:
-            self.loaded = False
+            # Element handles wait for their session
+            session = getattr(self, 'session', self)
+            session.loaded = False
             func(self, *args, **kwargs)
-            return self.wait_for_page_loaded(
+            return session.wait_for_page_loaded(
                 timeout=kwargs.pop('timeout', None))
         return func(self, *args, **kwargs)
     return wrapper
 
 
+class ElementHandle(object):
+    """Handle on an element resolved once by `Session.query`, so that
+    interactions don't query the frame again.
+
+    Handles raise `StaleElementError` once their element is removed from
+    the document or the page is navigated away.
+
+    :param session: The parent `Session`.
+    :param element: The resolved QWebElement.
+    :param selector: The selector the element was resolved from.
+    """
+    def __init__(self, session, element, selector):
+        self.session = session
+        self.element = element
+        self.selector = selector
+        self._load_count = session._load_count
+
+    @property
+    def stale(self):
+        """Whether the element left the document."""
+        if self.element.isNull():
+            return True
+        attached = self.element.evaluateJavaScript(_attached_script)
+        if attached is None:
+            # Javascript is disabled or the document is gone
+            return self._load_count != self.session._load_count
+        return not attached
+
+    def _resolve(self):
+        """Returns the element, checking it is still attached."""
+        if self.stale:
+            raise StaleElementError(
+                'Element matching "%s" is no longer attached to the '
+                'document' % self.selector)
+        return self.element
+
+    @can_load_page
+    def call(self, method):
+        """Calls method on the element.
+
+        :param method: The name of the method to call.
+        :param expect_loading: Specifies if a page loading is expected.
+        """
+        return self.session._invoke_on(self._resolve(), 'callElement',
+                                       method)
+
+    @can_load_page
+    def click(self, btn=0):
+        """Clicks the element.
+
+        :param btn: The number of mouse button.
+        """
+        return (
+            self.session._invoke_on(self._resolve(), 'clickElement', btn),
+            self.session._release_last_resources(),
+        )
+
+    @can_load_page
+    def fill(self, value, blur=True):
+        """Sets the value of the field element, see
+        `Session.set_field_value`.
+
+        :param value: The value to fill in.
+        :param blur: An optional boolean that force blur when filled in.
+        """
+        return self.session._set_element_value(self._resolve(), value, blur)
+
+    @can_load_page
+    def fire(self, event):
+        """Fires `event` on the element.
+
+        :param event: The name of the event to trigger.
+        """
+        return self.session._invoke_on(self._resolve(), 'fireElement',
+                                       event)
+
+    def attribute(self, name, default=None):
+        """Returns the value of attribute `name`.
+
+        :param name: The attribute name.
+        :param default: The value to return when the attribute is missing.
+        """
+        element = self._resolve()
+        if not element.hasAttribute(name):
+            return default
+        return unicode(element.attribute(name))
+
+    @property
+    def geometry(self):
+        """The element QRect in frame coordinates."""
+        return self._resolve().geometry()
+
+    @property
+    def region(self):
+        """The element region as a tuple, see
+        `Session.region_for_selector`.
+        """
+        geo = self.geometry
+        return geo.left(), geo.top(), geo.right(), geo.bottom()
+
+    def text(self):
+        """Returns the element visible text."""
+        return unicode(self._resolve().toPlainText())
+
+    def __repr__(self):
+        return '<ElementHandle "%s">' % self.selector
+
+
 def qt_type_to_python(obj, encoding='iso-8859-1'):
     """Cast Qt binding object to a python type.
 
@@ -222,6 +690,217 @@ def qt_type_to_python(obj, encoding='iso-8859-1'):
     return data.decode(encoding)
 
 
+class _ImageBuffer(object):
+    """Exposes 32 bits `image` memory through numpy array interface,
+    holding a reference to the image for as long as the array lives.
+    """
+    def __init__(self, image):
+        self.image = image
+        bits = image.constBits()
+        try:
+            # PyQt returns a sip.voidptr
+            data = (int(bits), True)
+        except TypeError:
+            # PySide returns a buffer
+            data = bits
+        self.__array_interface__ = {
+            'version': 3,
+            'typestr': '|u1',
+            'shape': (image.height(), image.width(), 4),
+            'strides': (image.bytesPerLine(), 4, 1),
+            'data': data,
+        }
+
+
+def image_to_array(image, rgb=False):
+    """Returns a read-only (height, width, 4) uint8 numpy array sharing
+    `image` memory, channels are in native byte order (BGRA on little
+    endian hosts). Non 32 bits images are converted first.
+
+    :param image: The QImage to expose.
+    :param rgb: Returns a (height, width, 3) RGB view instead.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise Error('numpy is required to get images as arrays')
+
+    if image.format() not in (
+        QImage.Format_ARGB32_Premultiplied,
+        QImage.Format_ARGB32,
+        QImage.Format_RGB32,
+    ):
+        image = image.convertToFormat(QImage.Format_ARGB32)
+
+    array = numpy.asarray(_ImageBuffer(image))
+    if rgb:
+        return array[..., 2::-1] if sys.byteorder == 'little' \
+            else array[..., 1:]
+    return array
+
+
+def encode_image(image, format='png', quality=-1):
+    """Returns `image` encoded as bytes, in memory.
+
+    QImage being reentrant, it can be called from any thread.
+
+    :param image: The QImage to encode.
+    :param format: The image format, like 'png', 'jpeg' or 'webp'.
+    :param quality: The compression quality from 0 to 100, -1 for default.
+    """
+    buffer = QtCore.QBuffer()
+    buffer.open(QtCore.QIODevice.WriteOnly)
+    if not image.save(buffer, format.upper(), quality):
+        raise Error('Unable to encode image as %s' % format)
+    return qt_type_to_python(buffer.data(), encoding=None)
+
+
+# Image formats QPainter can't paint on
+_unpaintable_formats = [
+    getattr(QImage, name) for name in (
+        'Format_Mono',
+        'Format_MonoLSB',
+        'Format_Indexed8',
+        'Format_Grayscale8',
+    ) if hasattr(QImage, name)
+]
+
+
+def _save_image(image, path, format='png', quality=-1):
+    """Saves `image` to `path`, can be called from any thread."""
+    if not image.save(path, format.upper(), quality):
+        raise Error('Unable to save image to %s' % path)
+    return path
+
+
+class FrameRecorder(object):
+    """Captures session viewport at a fixed frame rate, from a QTimer
+    running on the Qt event loop, so that page loads and interactions keep
+    going while recording. Frames are encoded in `Ghost.encoder_pool`.
+
+    Frames are saved as `frame-<slot>.<format>` where slot is the frame
+    index since recording started; a frame is dropped, leaving a gap in
+    slots, when the event loop was busy at its due time or when encoders
+    are lagging behind.
+
+    :param session: The `Session` to record.
+    :param directory: The frames destination directory.
+    :param fps: The target frame rate.
+    :param format: The frames image format.
+    :param quality: The compression quality from 0 to 100, -1 for default.
+    :param max_pending: The maximum number of frames waiting for encoding,
+        defaults to twice `Ghost.encoder_threads`.
+    """
+    def __init__(
+        self,
+        session,
+        directory,
+        fps=10,
+        format='png',
+        quality=-1,
+        max_pending=None,
+    ):
+        self.session = session
+        self.directory = directory
+        self.fps = fps
+        self.format = format
+        self.quality = quality
+        self.max_pending = max_pending or \
+            2 * session.ghost.encoder_threads
+        self.frames = 0
+        self.dropped = 0
+        self.paths = []
+        self._pending = []
+        self._slot = -1
+        self._started_at = None
+        self._error = None
+        self._timer = QtCore.QTimer()
+        self._timer.setInterval(int(1000 / fps))
+        if hasattr(self._timer, 'setTimerType'):
+            self._timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self._timer.timeout.connect(self._tick)
+
+    def start(self):
+        """Starts recording."""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self._started_at = time.time()
+        self._timer.start()
+        self._tick()
+        return self
+
+    def stop(self):
+        """Stops recording and waits for pending frames to be written.
+
+        Re-raises the first error that stopped recording, if any.
+
+        :return: The written frame paths.
+        """
+        self._timer.stop()
+        self._flush(wait=True)
+        self.session.logger.info('Recorded %d frames, dropped %d',
+                                 self.frames, self.dropped)
+        if self._error is not None:
+            raise self._error
+        return self.paths
+
+    def _fail(self, error):
+        """Stops recording on first `error`, kept for `stop` to raise."""
+        self.session.logger.error('Frame recording failed: %s', error)
+        if self._error is None:
+            self._error = error
+        self._timer.stop()
+
+    def _tick(self):
+        # Exceptions must not propagate back to Qt
+        try:
+            self._capture()
+        except Exception as e:
+            self._fail(e)
+
+    def _capture(self):
+        if self._error is not None:
+            return
+        slot = int((time.time() - self._started_at) * self.fps)
+        if slot <= self._slot:
+            return
+        # Slots skipped since last frame were due while the loop was busy
+        self.dropped += slot - self._slot - 1
+        self._slot = slot
+
+        self._flush()
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+
+        page = self.session.page
+        image = QImage(page.viewportSize(),
+                       QImage.Format_ARGB32_Premultiplied)
+        painter = QPainter(image)
+        page.mainFrame().render(painter)
+        painter.end()
+
+        path = os.path.join(self.directory,
+                            'frame-%06d.%s' % (slot, self.format))
+        self._pending.append(self.session.ghost.encoder_pool.apply_async(
+            _save_image, (image, path, self.format, self.quality)))
+        self.frames += 1
+
+    def _flush(self, wait=False):
+        """Collects written frames, failing on encoding errors."""
+        while self._pending and (wait or self._pending[0].ready()):
+            try:
+                self.paths.append(self._pending.pop(0).get())
+            except Exception as e:
+                self._fail(e)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
 class HttpResource(object):
     """Represents an HTTP resource.
     """
@@ -420,19 +1099,42 @@ class Ghost(object):
     :param plugin_path: Array with paths to plugin directories
         (default ['/usr/lib/mozilla/plugins'])
     :param defaults: The defaults arguments to pass to new child sessions.
+    :param qt_platform: An optional Qt platform plugin name to use instead
+        of QT_QPA_PLATFORM environment variable, 'offscreen' runs without
+        any display server (Qt5 only).
+    :param display: An optional X display to attach to (like ':99')
+        instead of DISPLAY environment variable, see `DisplayPool`.
+    :param encoder_threads: The number of threads encoding images in
+        background, see `Session.capture_bytes`.
     """
     _app = None
+    _encoder_pool = None
 
     def __init__(
         self,
         plugin_path=['/usr/lib/mozilla/plugins', ],
         defaults=None,
+        qt_platform=None,
+        display=None,
+        encoder_threads=2,
     ):
         if not BINDING:
             raise RuntimeError("Ghost.py requires PySide, PyQt4 or PyQt5")
 
-        qt_platform = os.environ.get('QT_QPA_PLATFORM', 'xcb')
         self.logger = logger.getChild('application')
+        self.startup_timings = {}
+        started_at = time.time()
+
+        if Ghost._app is not None and (qt_platform or display):
+            self.logger.warning('QT application is already running, '
+                                'ignoring platform and display settings')
+        else:
+            if qt_platform is not None:
+                os.environ['QT_QPA_PLATFORM'] = qt_platform
+            if display is not None:
+                os.environ['DISPLAY'] = display
+
+        qt_platform = os.environ.get('QT_QPA_PLATFORM', 'xcb')
         self.logger.info('Using QT_QPA_PLATFORM=%s', qt_platform)
 
         if qt_platform == 'xcb':
@@ -457,12 +1159,29 @@ class Ghost(object):
 
         # !!! Qt configuration for non X11 case is left to module consumers
 
+        self.startup_timings['display'] = time.time() - started_at
+
         qInstallMsgHandler(QTMessageProxy(logging.getLogger('qt')))
+
+        started_at = time.time()
+        self.app
+        self.startup_timings['qapplication'] = time.time() - started_at
+
+        # Only registers paths, plugins are scanned by WebKit on first use
+        started_at = time.time()
         if plugin_path:
             for p in plugin_path:
                 self.app.addLibraryPath(p)
+        self.startup_timings['library_paths'] = time.time() - started_at
+
+        self.logger.debug(
+            'Startup timings: %s',
+            ', '.join('%s=%.3fs' % timing
+                      for timing in sorted(self.startup_timings.items())),
+        )
 
         self.defaults = defaults or dict()
+        self.encoder_threads = encoder_threads
 
     @property
     def app(self):
@@ -471,7 +1190,19 @@ class Ghost(object):
             Ghost._app = QApplication.instance() or QApplication(['ghost'])
         return Ghost._app
 
+    @property
+    def encoder_pool(self):
+        """Thread pool encoding images out of the Qt event loop."""
+        if self._encoder_pool is None:
+            self._encoder_pool = ThreadPool(self.encoder_threads)
+        return self._encoder_pool
+
     def exit(self):
+        if self._encoder_pool is not None:
+            self.logger.debug('Waiting for image encoders')
+            self._encoder_pool.close()
+            self._encoder_pool.join()
+            self._encoder_pool = None
         self.logger.info('Stopping QT application')
         self.app.quit()
         if hasattr(self, 'xvfb'):
@@ -483,6 +1214,78 @@ class Ghost(object):
         kwargs.update(self.defaults)
         return Session(self, **kwargs)
 
+    def open_many(
+        self,
+        addresses,
+        sessions=2,
+        timeout=None,
+        poll_interval=0.01,
+        **kwargs
+    ):
+        """Loads web pages concurrently, yielding them as they complete.
+
+        Loads are dispatched to idle sessions, then Qt events are processed
+        until any of them completes. As the generator is suspended while
+        results are consumed, the page is available to the caller through
+        `page.session` until next iteration.
+
+        :param addresses: An iterable of resource URLs.
+        :param sessions: Either a list of `Session` to load pages with or
+            the number of sessions to start (and exit once done).
+        :param timeout: An optional per-load timeout, defaults to sessions'
+            `wait_timeout`.
+        :param poll_interval: Delay in seconds between two completion checks.
+        :param kwargs: Extra arguments passed to `Session.open`.
+        :return: A generator of (address, page, resources) tuples, page is
+            None when load timed out.
+        """
+        owned = isinstance(sessions, int)
+        if owned:
+            sessions = [self.start() for _ in range(sessions)]
+
+        addresses = iter(addresses)
+        idle = list(sessions)
+        in_flight = {}
+        kwargs['wait'] = False
+
+        try:
+            while True:
+                while idle:
+                    try:
+                        address = next(addresses)
+                    except StopIteration:
+                        break
+                    session = idle.pop()
+                    session.open(address, **kwargs)
+                    in_flight[session] = (address, time.time())
+
+                if not in_flight:
+                    return
+
+                time.sleep(poll_interval)
+                self.app.processEvents()
+
+                for session, (address, started_at) in list(in_flight.items()):
+                    limit = session.wait_timeout if timeout is None \
+                        else timeout
+                    if session._is_loaded():
+                        page, resources = session._loaded_page()
+                    elif time.time() > (started_at + limit):
+                        session.logger.warning('Timeout while loading %s',
+                                               address)
+                        session.page.triggerAction(QWebPage.Stop)
+                        page, resources = \
+                            None, session._release_last_resources()
+                    else:
+                        continue
+                    del in_flight[session]
+                    idle.append(session)
+                    yield address, page, resources
+        finally:
+            if owned:
+                for session in sessions:
+                    session.exit()
+
     def __del__(self):
         self.exit()
 
@@ -555,6 +1358,9 @@ class Session(object):
         self.loaded = True
 
         self.display = display
+        self.user_agent = user_agent
+        self.viewport_size = viewport_size
+        self.show_scrollbars = show_scrollbars
 
         self.popup_messages = []
         self.page = web_page_class(self)
@@ -596,14 +1402,7 @@ class Session(object):
             QtWebKit.QWebSettings.JavascriptEnabled, javascript_enabled)
 
         if not show_scrollbars:
-            self.page.mainFrame().setScrollBarPolicy(
-                QtCore.Qt.Vertical,
-                QtCore.Qt.ScrollBarAlwaysOff,
-            )
-            self.page.mainFrame().setScrollBarPolicy(
-                QtCore.Qt.Horizontal,
-                QtCore.Qt.ScrollBarAlwaysOff,
-            )
+            self._set_scrollbar_policy(QtCore.Qt.ScrollBarAlwaysOff)
 
         self.set_viewport_size(*viewport_size)
 
@@ -630,24 +1429,35 @@ class Session(object):
 
         self.main_frame = self.page.mainFrame()
 
-        class GhostQWebView(QWebView):
-            def sizeHint(self):
-                return QSize(*viewport_size)
-
-        self.webview = GhostQWebView()
+        # Inject helper library, data bridge and init scripts in every frame
+        self.bridge = DataBridge(self)
+        self.init_scripts = []
+        self.page.frameCreated.connect(self._frame_created)
+        self._frame_created(self.main_frame)
 
-        if plugins_enabled:
-            self.webview.settings().setAttribute(
-                QtWebKit.QWebSettings.PluginsEnabled, True)
-        if java_enabled:
-            self.webview.settings().setAttribute(
-                QtWebKit.QWebSettings.JavaEnabled, True)
-
-        self.webview.setPage(self.page)
+        # QWebView is only required to display or print the page
+        self._webview = None
+        self._content_cache = None
+        self._load_count = 0
 
         if self.display:
             self.show()
 
+    @property
+    def webview(self):
+        """The QWebView rendering the page, created on first access."""
+        if self._webview is None:
+            viewport_size = self.viewport_size
+
+            class GhostQWebView(QWebView):
+                def sizeHint(self):
+                    return QSize(*viewport_size)
+
+            self.logger.debug('Creating webview')
+            self._webview = GhostQWebView()
+            self._webview.setPage(self.page)
+        return self._webview
+
     def frame(self, selector=None):
         """ Set main frame as current main frame's parent.
 
@@ -685,68 +1495,265 @@ class Session(object):
         :param expect_loading: Specifies if a page loading is expected.
         """
         self.logger.debug('Calling `%s` method on `%s`', method, selector)
-        element = self.main_frame.findFirstElement(selector)
-        return element.evaluateJavaScript('this[%s]();' % repr(method))
+        return self._invoke('call', selector, method)
 
     def capture(
         self,
         region=None,
         selector=None,
         format=None,
+        width=None,
     ):
         """Returns snapshot as QImage.
 
+        Region and selector snapshots only allocate an image of the region
+        size, whatever the frame size is. Smaller formats like
+        `QImage.Format_RGB16` or `QImage.Format_Grayscale8` and thumbnail
+        widths reduce the allocated memory further, thumbnails being
+        rendered scaled down rather than resized afterwards.
+
         :param region: An optional tuple containing region as pixel
             coodinates.
         :param selector: A selector targeted the element to crop on.
         :param format: The output image format.
+        :param width: An optional thumbnail width, the snapshot is scaled
+            down to it keeping its aspect ratio.
         """
 
         if format is None:
             format = QImage.Format_ARGB32_Premultiplied
 
-        self.main_frame.setScrollBarPolicy(
-            QtCore.Qt.Vertical,
-            QtCore.Qt.ScrollBarAlwaysOff,
-        )
-        self.main_frame.setScrollBarPolicy(
-            QtCore.Qt.Horizontal,
-            QtCore.Qt.ScrollBarAlwaysOff,
-        )
+        self._set_scrollbar_policy(QtCore.Qt.ScrollBarAlwaysOff,
+                                   self.main_frame)
         frame_size = self.main_frame.contentsSize()
         max_size = 23170 * 23170
-        if frame_size.height() * frame_size.width() > max_size:
+        if region is None and selector is None and \
+                frame_size.height() * frame_size.width() > max_size:
             self.logger.warning("Frame size is too large.")
             default_size = self.page.viewportSize()
             if default_size.height() * default_size.width() > max_size:
                 return None
         else:
-            self.page.setViewportSize(self.main_frame.contentsSize())
+            # Only lays the frame out, no pixel is allocated here
+            self.page.setViewportSize(frame_size)
 
         self.logger.info("Frame size -> %s", str(self.page.viewportSize()))
 
-        image = QImage(self.page.viewportSize(), format)
-        painter = QPainter(image)
-
         if region is None and selector is not None:
             region = self.region_for_selector(selector)
 
         if region:
             x1, y1, x2, y2 = region
-            w, h = (x2 - x1), (y2 - y1)
-            reg = QRegion(x1, y1, w, h)
-            self.main_frame.render(painter, reg)
         else:
-            self.main_frame.render(painter)
+            size = self.page.viewportSize()
+            x1, y1, x2, y2 = 0, 0, size.width(), size.height()
 
-        painter.end()
+        scale = 1.0
+        if width is not None and x2 > x1:
+            scale = float(width) / (x2 - x1)
+        return self._render(x1, y1, x2 - x1, y2 - y1, format, scale)
 
-        if region:
-            x1, y1, x2, y2 = region
-            w, h = (x2 - x1), (y2 - y1)
-            image = image.copy(x1, y1, w, h)
+    def capture_array(
+        self,
+        region=None,
+        selector=None,
+        rgb=False,
+    ):
+        """Returns snapshot as a numpy array without copying rendered
+        pixels, see `image_to_array`.
 
-        return image
+        :param region: An optional tuple containing region as pixel
+            coodinates.
+        :param selector: A selector targeted the element to crop on.
+        :param rgb: Returns RGB channels instead of native BGRA ones.
+        """
+        image = self.capture(region=region, selector=selector)
+        if image is None:
+            return None
+        return image_to_array(image, rgb=rgb)
+
+    def capture_bytes(
+        self,
+        format='png',
+        quality=-1,
+        region=None,
+        selector=None,
+        background=False,
+        width=None,
+    ):
+        """Returns snapshot encoded as bytes, see `encode_image`.
+
+        :param format: The image format, like 'png', 'jpeg' or 'webp'.
+        :param quality: The compression quality from 0 to 100, -1 for
+            default.
+        :param region: An optional tuple containing region as pixel
+            coodinates.
+        :param selector: A selector targeted the element to crop on.
+        :param width: An optional thumbnail width, see `capture`.
+        :param background: Encode in `Ghost.encoder_pool` so that Qt events
+            keep being processed meanwhile, returns an AsyncResult whose
+            get() method returns the bytes.
+        """
+        image = self.capture(region=region, selector=selector, width=width)
+        if image is None:
+            return None
+        if background:
+            return self.ghost.encoder_pool.apply_async(
+                encode_image, (image, format, quality))
+        return encode_image(image, format, quality)
+
+    def capture_many(
+        self,
+        selectors,
+        output='image',
+        image_format='png',
+        quality=-1,
+        format=None,
+    ):
+        """Captures many elements at once: the frame is laid out and the
+        area covering all of them rendered a single time, then cropped.
+        Elements spread over a much larger area than their own are
+        rendered one by one instead.
+
+        :param selectors: An iterable of selectors targeting the elements.
+        :param output: Either 'image' (QImage), 'array' (numpy array views,
+            see `image_to_array`) or 'bytes' (see `encode_image`).
+        :param image_format: The encoding format for 'bytes' output.
+        :param quality: The encoding quality for 'bytes' output.
+        :param format: The QImage format.
+        :return: A dict mapping selectors to their snapshot.
+        """
+        if output not in ('image', 'array', 'bytes'):
+            raise ValueError('Unsupported output %s' % output)
+        if format is None:
+            format = QImage.Format_ARGB32_Premultiplied
+
+        self._set_scrollbar_policy(QtCore.Qt.ScrollBarAlwaysOff,
+                                   self.main_frame)
+        self.page.setViewportSize(self.main_frame.contentsSize())
+
+        regions = dict(
+            (selector, self.region_for_selector(selector))
+            for selector in selectors
+        )
+        if not regions:
+            return {}
+        left = min(region[0] for region in regions.values())
+        top = min(region[1] for region in regions.values())
+        width = max(region[2] for region in regions.values()) - left
+        height = max(region[3] for region in regions.values()) - top
+
+        area = width * height
+        elements_area = sum((x2 - x1) * (y2 - y1)
+                            for x1, y1, x2, y2 in regions.values())
+        # Sparse elements would allocate a mostly unused image, say one
+        # at the top and one at the bottom of a long page
+        if area > 23170 * 23170 or \
+                area > max(1024 * 1024, 4 * elements_area):
+            self.logger.info('Elements are spread over a large area, '
+                             'rendering them one by one')
+            crops = dict(
+                (selector, self._render(x1, y1, x2 - x1, y2 - y1, format))
+                for selector, (x1, y1, x2, y2) in regions.items()
+            )
+        else:
+            image = self._render(left, top, width, height, format)
+            if output == 'array':
+                # Views sharing the rendered image memory
+                array = image_to_array(image)
+                return dict(
+                    (selector, array[y1 - top:y2 - top, x1 - left:x2 - left])
+                    for selector, (x1, y1, x2, y2) in regions.items()
+                )
+            crops = dict(
+                (selector, image.copy(x1 - left, y1 - top, x2 - x1, y2 - y1))
+                for selector, (x1, y1, x2, y2) in regions.items()
+            )
+
+        if output == 'array':
+            return dict((selector, image_to_array(crop))
+                        for selector, crop in crops.items())
+        if output == 'bytes':
+            return dict((selector, encode_image(crop, image_format, quality))
+                        for selector, crop in crops.items())
+        return crops
+
+    def capture_tiles(self, tile_size=(1024, 1024), format=None):
+        """Renders the whole frame tile by tile, only allocating one tile
+        at a time whatever the frame size is.
+
+        :param tile_size: A (width, height) tuple.
+        :param format: The output image format.
+        :return: A generator of (x, y, QImage) tuples.
+        """
+        if format is None:
+            format = QImage.Format_ARGB32_Premultiplied
+
+        viewport_size = self.page.viewportSize()
+        self._set_scrollbar_policy(QtCore.Qt.ScrollBarAlwaysOff,
+                                   self.main_frame)
+        frame_size = self.main_frame.contentsSize()
+        self.page.setViewportSize(frame_size)
+        tile_width, tile_height = tile_size
+
+        try:
+            for y in range(0, frame_size.height(), tile_height):
+                for x in range(0, frame_size.width(), tile_width):
+                    yield x, y, self._render(
+                        x,
+                        y,
+                        min(tile_width, frame_size.width() - x),
+                        min(tile_height, frame_size.height() - y),
+                        format,
+                    )
+        finally:
+            self.page.setViewportSize(viewport_size)
+
+    def capture_tiles_to(
+        self,
+        path=None,
+        tile_size=(1024, 1024),
+        stitch_to=None,
+    ):
+        """Saves the whole frame as tiles and/or a stitched numpy array,
+        keeping memory use bounded by the tile size.
+
+        :param path: An optional destination path template formatted with
+            tile `x` and `y` pixel coordinates, like 'tile_{y}_{x}.png'.
+        :param tile_size: A (width, height) tuple.
+        :param stitch_to: An optional .npy destination path where to stitch
+            tiles as a (height, width, 4) uint8 array, without the
+            23170x23170 QImage size limit (requires numpy).
+        :return: The list of saved tiles paths.
+        """
+        paths, stitched = [], None
+
+        if stitch_to is not None:
+            try:
+                from numpy.lib.format import open_memmap
+            except ImportError:
+                raise Error('numpy is required to stitch tiles')
+            # Measured the way capture_tiles does, without scrollbars
+            self._set_scrollbar_policy(QtCore.Qt.ScrollBarAlwaysOff,
+                                       self.main_frame)
+            size = self.main_frame.contentsSize()
+            stitched = open_memmap(stitch_to, mode='w+', dtype='uint8',
+                                   shape=(size.height(), size.width(), 4))
+
+        for x, y, image in self.capture_tiles(tile_size):
+            if path is not None:
+                paths.append(path.format(x=x, y=y))
+                # Format is guessed from the path suffix
+                if not image.save(paths[-1]):
+                    raise Error('Unable to save image to %s' % paths[-1])
+            if stitched is not None:
+                stitched[y:y + image.height(), x:x + image.width()] = \
+                    image_to_array(image)
+
+        if stitched is not None:
+            stitched.flush()
+            del stitched
+        return paths
 
     def capture_to(
         self,
@@ -754,6 +1761,7 @@ class Session(object):
         region=None,
         selector=None,
         format=None,
+        width=None,
     ):
         """Saves snapshot as image.
 
@@ -762,13 +1770,14 @@ class Session(object):
             coodinates.
         :param selector: A selector targeted the element to crop on.
         :param format: The output image format.
+        :param width: An optional thumbnail width, see `capture`.
         """
 
         if format is None:
             format = QImage.Format_ARGB32_Premultiplied
 
         self.capture(region=region, format=format,
-                     selector=selector).save(path)
+                     selector=selector, width=width).save(path)
 
     def print_to_pdf(
         self,
@@ -789,25 +1798,63 @@ class Session(object):
         :param paper_units: Units for pager_size, pager_margins.
         :param zoom_factor: Scale the output content.
         """
-        assert len(paper_size) == 2
-        assert len(paper_margins) == 4
-
-        if paper_units is None:
-            paper_units = QPrinter.Inch
-
-        printer = QPrinter(mode=QPrinter.ScreenResolution)
-        printer.setOutputFormat(QPrinter.PdfFormat)
-        printer.setPaperSize(QtCore.QSizeF(*paper_size), paper_units)
-        printer.setPageMargins(*(paper_margins + (paper_units,)))
-        if paper_margins != (0, 0, 0, 0):
-            printer.setFullPage(True)
+        printer = self._pdf_printer(paper_size, paper_margins, paper_units)
         printer.setOutputFileName(path)
-        if self.webview is None:
-            self.webview = QWebView()
-            self.webview.setPage(self.page)
         self.webview.setZoomFactor(zoom_factor)
         self.webview.print_(printer)
 
+    def print_many_to_pdf(
+        self,
+        items,
+        paper_size=(8.5, 11.0),
+        paper_margins=(0, 0, 0, 0),
+        paper_units=None,
+        zoom_factor=1.0,
+        timeout=None,
+    ):
+        """Loads and saves many pages as pdf files sharing paper settings,
+        one printer being configured for the whole batch. Items are
+        consumed lazily and (path, error) tuples are yielded as files are
+        written, error being None on success. Items failing to load are
+        logged and skipped so that the rest of the batch goes on.
+
+        .. code:: python
+
+            items = [
+                {'path': 'a.pdf', 'url': 'http://jeanphix.me'},
+                {'path': 'b.pdf', 'html': '<h1>Invoice</h1>'},
+            ]
+            for path, error in session.print_many_to_pdf(items):
+                if error is None:
+                    upload(path)
+
+        :param items: An iterable of dicts with a 'path' key and either an
+            'url' key or an 'html' key, with an optional 'base_url' one.
+        :param paper_size: A 2-tuple indicating size of page to print to.
+        :param paper_margins: A 4-tuple indicating size of each margin.
+        :param paper_units: Units for pager_size, pager_margins.
+        :param zoom_factor: Scale the output content.
+        :param timeout: An optional timeout per page load.
+        """
+        printer = self._pdf_printer(paper_size, paper_margins, paper_units)
+        webview = self.webview
+
+        for item in items:
+            try:
+                if 'html' in item:
+                    self.set_content(item['html'], item.get('base_url'),
+                                     timeout=timeout)
+                else:
+                    self.open(item['url'], timeout=timeout)
+            except Error as e:
+                self.logger.error("Can't load %s: %s", item['path'], e)
+                yield item['path'], e
+                continue
+            webview.setZoomFactor(zoom_factor)
+            printer.setOutputFileName(item['path'])
+            webview.print_(printer)
+            yield item['path'], None
+
     @can_load_page
     def click(self, selector, btn=0):
         """Click the targeted element.
@@ -820,15 +1867,10 @@ class Session(object):
         """
         if not self.exists(selector):
             raise Error("Can't find element to click")
-        return self.evaluate("""
-            (function () {
-                var element = document.querySelector(%s);
-                var evt = document.createEvent("MouseEvents");
-                evt.initMouseEvent("click", true, true, window, 1, 1, 1, 1, 1,
-                    false, false, false, false, %s, element);
-                return element.dispatchEvent(evt);
-            })();
-        """ % (repr(selector), str(btn)))
+        return (
+            self._invoke('click', selector, btn),
+            self._release_last_resources(),
+        )
 
     @contextmanager
     def confirm(self, confirm=True):
@@ -846,10 +1888,17 @@ class Session(object):
 
         :param to_unicode: Whether to convert html to unicode or not
         """
+        # Serialized HTML is cached until the DOM generation changes
+        frame = self.main_frame
+        generation = frame.evaluateJavaScript(_generation_script)
+        cache = self._content_cache
+        if generation is None or cache is None or cache[0] is not frame \
+                or cache[1] != generation:
+            cache = self._content_cache = (frame, generation, frame.toHtml())
         if to_unicode:
-            return unicode(self.main_frame.toHtml())
+            return unicode(cache[2])
         else:
-            return self.main_frame.toHtml()
+            return cache[2]
 
     @property
     def cookies(self):
@@ -881,6 +1930,50 @@ class Session(object):
             self._release_last_resources(),
         )
 
+    def extract(self, spec):
+        """Extracts data from elements of current frame in a single pass.
+
+        .. code:: python
+
+            session.extract({
+                'links': {
+                    'selector': 'a',
+                    'fields': {'label': 'text', 'url': '@href'},
+                },
+                'rows': {
+                    'selector': 'table tr',
+                    'fields': {'price': ('td.price', 'text')},
+                },
+            })
+
+        Field values are either 'text' (trimmed text content), 'html'
+        (inner HTML), '@name' (attribute), '.name' (DOM property) or a
+        (selector, value) tuple to read from a descendant element, None when
+        it does not exist.
+
+        :param spec: A dict mapping names to a selector and its fields.
+        :return: A dict mapping names to lists of dicts, one per element.
+        """
+        for name, target in spec.items():
+            for field in target['fields'].values():
+                if isinstance(field, (list, tuple)):
+                    field = field[1]
+                if field not in ('text', 'html') and field[:1] not in '@.':
+                    raise ValueError('Unsupported field %r for %s'
+                                     % (field, name))
+        return self._invoke('extract', spec)
+
+    def evaluate_value(self, script):
+        """Evaluates script in current frame and returns its result only.
+
+        Unlike `evaluate`, loaded resources are not released, which makes it
+        cheaper in tight loops. They stay in `http_resources` until
+        `release_resources` or any resource returning method is called.
+
+        :param script: The script to evaluate.
+        """
+        return self.main_frame.evaluateJavaScript(script)
+
     def evaluate_js_file(self, path, encoding='utf-8', **kwargs):
         """Evaluates javascript file at given path in current frame.
         Raises native IOException in case of invalid file.
@@ -902,20 +1995,25 @@ class Session(object):
         """Exits all Qt widgets."""
         self.logger.info("Closing session")
         self.page.deleteLater()
-        self.webview.deleteLater()
+        if self._webview is not None:
+            self._webview.deleteLater()
         self.cookie_jar.deleteLater()
         self.manager.deleteLater()
         self.main_frame.deleteLater()
 
     @can_load_page
-    def fill(self, selector, values):
+    def fill(self, selector, values, batch=False):
         """Fills a form with provided values.
 
         :param selector: A CSS selector to the target form to fill.
         :param values: A dict containing the values.
+        :param batch: Fill all fields but file ones with a single
+            javascript call instead of one `set_field_value` per field.
         """
         if not self.exists(selector):
             raise Error("Can't find form")
+        if batch:
+            return self._fill_batch(selector, values)
         resources = []
         for field in values:
             r, res = self.set_field_value(
@@ -931,27 +2029,21 @@ class Session(object):
         :param event: The name of the event to trigger.
         """
         self.logger.debug('Fire `%s` on `%s`', event, selector)
-        element = self.main_frame.findFirstElement(selector)
-        return element.evaluateJavaScript("""
-            var event = document.createEvent("HTMLEvents");
-            event.initEvent('%s', true, true);
-            this.dispatchEvent(event);
-        """ % event)
+        return self._invoke('fire', selector, event)
 
     def global_exists(self, global_name):
         """Checks if javascript global exists.
 
         :param global_name: The name of the global.
         """
-        return self.evaluate(
-            '!(typeof this[%s] === "undefined");'
-            % repr(global_name)
-        )[0]
+        return self._invoke('globalExists', global_name)
 
     def hide(self):
         """Close the webview."""
+        if self._webview is None:
+            return
         try:
-            self.webview.close()
+            self._webview.close()
         except:
             raise Error("no webview to close")
 
@@ -1113,6 +2205,25 @@ class Session(object):
         yield
         self._prompt_expected = None
 
+    def record(self, directory, fps=10, format='png', quality=-1):
+        """Returns a `FrameRecorder` of session viewport, to be used as a
+        context manager around page loads or interactions.
+
+        .. code:: python
+
+            with session.record('frames', fps=30) as recorder:
+                session.open('http://jeanphix.me')
+            print(recorder.frames, recorder.dropped)
+
+        :param directory: The frames destination directory.
+        :param fps: The target frame rate.
+        :param format: The frames image format.
+        :param quality: The compression quality from 0 to 100, -1 for
+            default.
+        """
+        return FrameRecorder(self, directory, fps=fps, format=format,
+                             quality=quality)
+
     def region_for_selector(self, selector):
         """Returns frame region for given selector as tuple.
 
@@ -1125,24 +2236,92 @@ class Session(object):
             raise Error("can't get region for selector '%s'" % selector)
         return region
 
-    def save_cookies(self, cookie_storage):
-        """Save to cookielib's CookieJar or Set-Cookie3 format text file.
+    def query(self, selector):
+        """Returns an `ElementHandle` on the first element matching
+        `selector` in current frame, or None.
 
-        :param cookie_storage: file location string or CookieJar instance.
+        :param selector: The selector of the element.
         """
-        def toPyCookieJar(QtCookieJar, PyCookieJar):
-            for c in QtCookieJar.allCookies():
-                PyCookieJar.set_cookie(toPyCookie(c))
+        element = self.main_frame.findFirstElement(selector)
+        if element.isNull():
+            return None
+        return ElementHandle(self, element, selector)
 
-        def toPyCookie(QtCookie):
-            port = None
-            port_specified = False
-            secure = QtCookie.isSecure()
-            name = qt_type_to_python(QtCookie.name())
-            value = qt_type_to_python(QtCookie.value())
-            v = str(QtCookie.path())
-            path_specified = bool(v != "")
-            path = v if path_specified else None
+    def query_all(self, selector):
+        """Returns `ElementHandle` instances on all elements matching
+        `selector` in current frame.
+
+        :param selector: The selector of the elements.
+        """
+        return [
+            ElementHandle(self, element, selector)
+            for element in self.main_frame.findAllElements(selector)
+        ]
+
+    def readable_text(self):
+        """Returns the text of current frame main content, leaving out
+        navigation, headers and other boilerplate. It runs in page context
+        so that no HTML is serialized.
+        """
+        return self._invoke('readable')
+
+    def release_resources(self):
+        """Returns resources loaded since last release and forgets them."""
+        return self._release_last_resources()
+
+    def reset(self, timeout=None):
+        """Resets session state so that it can be reused for another job.
+
+        Clears web storage of the current origin, init scripts and data
+        handlers, navigates to about:blank, then clears cookies,
+        resources, popup state and restores the user agent, viewport size
+        and scrollbars set at creation.
+
+        :param timeout: An optional timeout for about:blank loading.
+        """
+        self.logger.info('Resetting session')
+        self.frame()
+        self.main_frame.evaluateJavaScript(
+            'try { localStorage.clear(); sessionStorage.clear(); }'
+            ' catch (e) {}'
+        )
+        self.page.set_user_agent(self.user_agent)
+        del self.init_scripts[:]
+        self.bridge.handlers.clear()
+        self.open('about:blank', timeout=timeout)
+
+        self.delete_cookies()
+        self._release_last_resources()
+        self.popup_messages = []
+        self._alert = None
+        self._confirm_expected = None
+        self._prompt_expected = None
+        self._upload_file = None
+
+        self._set_scrollbar_policy(
+            QtCore.Qt.ScrollBarAsNeeded if self.show_scrollbars
+            else QtCore.Qt.ScrollBarAlwaysOff
+        )
+        self.set_viewport_size(*self.viewport_size)
+
+    def save_cookies(self, cookie_storage):
+        """Save to cookielib's CookieJar or Set-Cookie3 format text file.
+
+        :param cookie_storage: file location string or CookieJar instance.
+        """
+        def toPyCookieJar(QtCookieJar, PyCookieJar):
+            for c in QtCookieJar.allCookies():
+                PyCookieJar.set_cookie(toPyCookie(c))
+
+        def toPyCookie(QtCookie):
+            port = None
+            port_specified = False
+            secure = QtCookie.isSecure()
+            name = qt_type_to_python(QtCookie.name())
+            value = qt_type_to_python(QtCookie.value())
+            v = str(QtCookie.path())
+            path_specified = bool(v != "")
+            path = v if path_specified else None
             v = str(QtCookie.domain())
             domain_specified = bool(v != "")
             domain = v
@@ -1193,103 +2372,34 @@ class Session(object):
         """
         self.logger.debug('Setting value "%s" for "%s"', value, selector)
 
-        def _set_checkbox_value(el, value):
-            el.setFocus()
-            if value is True:
-                el.setAttribute('checked', 'checked')
-            else:
-                el.removeAttribute('checked')
-
-        def _set_checkboxes_value(els, value):
-            for el in els:
-                if el.attribute('value') == value:
-                    _set_checkbox_value(el, True)
-                else:
-                    _set_checkbox_value(el, False)
-
-        def _set_radio_value(els, value):
-            for el in els:
-                if el.attribute('value') == value:
-                    el.setFocus()
-                    el.setAttribute('checked', 'checked')
-
-        def _set_text_value(el, value):
-            el.setFocus()
-            el.setAttribute('value', value)
-
-        def _set_select_value(el, value):
-            el.setFocus()
-            index = 0
-            for option in el.findAll('option'):
-                if option.attribute('value') == value:
-                    option.evaluateJavaScript('this.selected = true;')
-                    el.evaluateJavaScript('this.selectedIndex = %d;' % index)
-                    break
-                index += 1
-
-        def _set_textarea_value(el, value):
-            el.setFocus()
-            el.setPlainText(value)
-
-        res, resources = None, []
         element = self.main_frame.findFirstElement(selector)
         if element.isNull():
             raise Error('can\'t find element for %s"' % selector)
 
-        tag_name = str(element.tagName()).lower()
-
-        if tag_name == "select":
-            _set_select_value(element, value)
-        elif tag_name == "textarea":
-            _set_textarea_value(element, value)
-        elif tag_name == "input":
-            type_ = str(element.attribute('type')).lower()
-            if type_ in [
-                "color",
-                "date",
-                "datetime",
-                "datetime-local",
-                "email",
-                "hidden",
-                "month",
-                "number",
-                "password",
-                "range",
-                "search",
-                "tel",
-                "text",
-                "time",
-                "url",
-                "week",
-                "",
-            ]:
-                _set_text_value(element, value)
-            elif type_ == "checkbox":
-                els = self.main_frame.findAllElements(selector)
-                if els.count() > 1:
-                    _set_checkboxes_value(els, value)
-                else:
-                    _set_checkbox_value(element, value)
-            elif type_ == "radio":
-                _set_radio_value(
-                    self.main_frame.findAllElements(selector),
-                    value,
-                )
-            elif type_ == "file":
-                self._upload_file = value
-                res, resources = self.click(selector)
-
-                self._upload_file = None
-        else:
-            raise Error('unsupported field tag')
+        return self._set_element_value(
+            element, value, blur,
+            lambda: self.main_frame.findAllElements(selector),
+        )
 
-        for event in ['input', 'change']:
-            self.fire(selector, event)
+    def set_content(self, html, base_url=None, wait=True, timeout=None):
+        """Loads `html` in main frame, without any network request for
+        the document itself.
 
-        if blur:
-            self.call(selector, 'blur')
+        :param html: The HTML document.
+        :param base_url: An optional URL relative resources are resolved
+            against.
+        :param wait: If set to True (which is the default), this
+            method call waits for the page load to complete before
+            returning.
+        :param timeout: An optional timeout.
+        :return: Page resource (None as it is not requested), and all
+            loaded resources, unless wait is False.
+        """
+        self.loaded = False
+        self.main_frame.setHtml(html, QUrl(base_url or ''))
 
-        return res, resources
+        if wait:
+            return self.wait_for_page_loaded(timeout=timeout)
 
     def set_proxy(
         self,
@@ -1343,6 +2453,31 @@ class Session(object):
         """
         self.page.setViewportSize(QSize(width, height))
 
+    def add_init_script(self, source):
+        """Adds a script evaluated in main frame and all child frames of
+        next loaded documents, before any of their own scripts run.
+
+        :param source: The script source.
+        """
+        self.init_scripts.append(source)
+
+    def remove_init_script(self, source):
+        """Removes a script added with `add_init_script`."""
+        self.init_scripts.remove(source)
+
+    def add_data_handler(self, channel, handler):
+        """Registers a handler for records page scripts send on `channel`
+        with `__ghost.send(channel, items, batchSize, map)`.
+
+        :param channel: The channel name.
+        :param handler: A callable receiving each batch as a list.
+        """
+        self.bridge.handlers[channel] = handler
+
+    def remove_data_handler(self, channel):
+        """Unregisters handler of `channel`."""
+        self.bridge.handlers.pop(channel, None)
+
     def append_popup_message(self, message):
         self.popup_messages.append(unicode(message))
 
@@ -1360,6 +2495,20 @@ class Session(object):
             time.sleep(value / 10)
             self.ghost.app.processEvents()
 
+    def text(self, selector=None):
+        """Returns visible text of current frame, or of the first element
+        matching `selector`, without serializing HTML.
+
+        :param selector: An optional selector of the element.
+        """
+        if selector is None:
+            return unicode(self.main_frame.toPlainText())
+
+        element = self.main_frame.findFirstElement(selector)
+        if element.isNull():
+            raise Error('Can\'t find element matching "%s"' % selector)
+        return unicode(element.toPlainText())
+
     def wait_for(self, condition, timeout_message, timeout=None):
         """Waits until condition is True.
 
@@ -1394,21 +2543,9 @@ class Session(object):
 
         :param timeout: An optional timeout.
         """
-        self.wait_for(lambda: self.loaded and self.manager.requests == 0,
-                      'Unable to load requested page', timeout)
-        resources = self._release_last_resources()
-        page = None
-
-        url = self.main_frame.url().toString()
-        url_without_hash = url.split("#")[0]
-
-        for resource in resources:
-            if url == resource.url or url_without_hash == resource.url:
-                page = resource
-
-        self.logger.info('Page loaded %s', url)
-
-        return page, resources
+        self.wait_for(self._is_loaded, 'Unable to load requested page',
+                      timeout)
+        return self._loaded_page()
 
     def wait_for_selector(self, selector, timeout=None):
         """Waits until selector match an element on the frame.
@@ -1461,6 +2598,268 @@ class Session(object):
             authenticator.setPassword(password)
             self._auth_attempt += 1
 
+    def _evaluate_helper(self, frame, target, name, args):
+        """Evaluates helper `name` invocation on `target`, a frame or an
+        element of `frame`, injecting the library when it is missing.
+
+        :param args: The javascript expression of arguments array.
+        :raise Error: When the helper throws.
+        """
+        script = _invoke_script % (json.dumps(name), args)
+        result = target.evaluateJavaScript(script)
+        if result is None:
+            # Library is missing, e.g. page scripts removed it
+            frame.evaluateJavaScript(_helpers_script)
+            result = target.evaluateJavaScript(script)
+            if result is None:
+                self.logger.warning("Can't invoke helper %s, is javascript "
+                                    "enabled?", name)
+                return None
+        if isinstance(result, dict):
+            raise Error('Helper %s failed: %s' % (name, result.get('error')))
+        return result[0]
+
+    def _field_group(self, element):
+        """Returns the list of fields sharing `element` name and type in
+        its form, or in its document when it has no form.
+
+        :param element: The QWebElement of the field.
+        """
+        name = unicode(element.attribute('name'))
+        if not name:
+            return [element]
+
+        scope = element.parent()
+        while not scope.isNull() and str(scope.tagName()).lower() != 'form':
+            scope = scope.parent()
+        if scope.isNull():
+            scope = element.document()
+
+        def type_of(field):
+            return str(field.attribute('type')).lower()
+
+        escaped = name.replace('\\', '\\\\').replace('"', '\\"')
+        # Hidden fallback fields often share checkboxes name
+        return [
+            field for field in scope.findAll('[name="%s"]' % escaped)
+            if type_of(field) == type_of(element)
+        ] or [element]
+
+    def _fill_batch(self, selector, values, blur=True):
+        """Fills form fields in page context, see `fill`."""
+        self.logger.debug('Filling %d fields of "%s"', len(values), selector)
+        result = self._invoke('fillForm', selector, values, blur)
+        if result['missing']:
+            raise Error("can't find fields %s in %s" % (
+                ', '.join(result['missing']), selector))
+        if result['unsupported']:
+            raise Error('unsupported field tag')
+
+        resources = []
+        for field in result['files']:
+            r, res = self.set_field_value(
+                "%s [name=%s]" % (selector, repr(field)), values[field],
+                blur=blur)
+            resources.extend(res)
+        return True, resources
+
+    def _frame_created(self, frame):
+        """Called back when a frame is created."""
+        frame.javaScriptWindowObjectCleared.connect(
+            partial(self._window_object_cleared, frame))
+
+    def _invoke(self, name, *args):
+        """Invokes helper library function `name` in current frame.
+
+        :param name: The name of the helper.
+        :param args: JSON serializable arguments.
+        :return: The helper result.
+        """
+        return self._evaluate_helper(self.main_frame, self.main_frame, name,
+                                     json.dumps(args))
+
+    def _invoke_on(self, element, name, *args):
+        """Invokes helper library function `name` with `element` as first
+        argument, in the element frame.
+
+        :param element: The QWebElement to pass.
+        :param name: The name of the helper.
+        :param args: Extra JSON serializable arguments.
+        :return: The helper result.
+        """
+        return self._evaluate_helper(element.webFrame(), element, name,
+                                     '[this].concat(%s)' % json.dumps(args))
+
+    def _is_loaded(self):
+        """Checks if requested page and all its resources are loaded."""
+        return self.loaded and self.manager.requests == 0
+
+    def _loaded_page(self):
+        """Returns the loaded page resource and the released resources."""
+        resources = self._release_last_resources()
+        page = None
+
+        url = self.main_frame.url().toString()
+        url_without_hash = url.split("#")[0]
+
+        for resource in resources:
+            if url == resource.url or url_without_hash == resource.url:
+                page = resource
+
+        self.logger.info('Page loaded %s', url)
+
+        return page, resources
+
+    def _render(self, x, y, width, height, format, scale=1.0):
+        """Renders frame area into a QImage of the area size.
+
+        Formats QPainter can't paint on are rendered as 32 bits images,
+        then converted.
+
+        :param x: The area left pixel coordinate.
+        :param y: The area top pixel coordinate.
+        :param width: The area width.
+        :param height: The area height.
+        :param format: The image format.
+        :param scale: The scale factor of the output image.
+        """
+        paint_format = format
+        if format in _unpaintable_formats:
+            paint_format = QImage.Format_RGB32
+
+        image = QImage(max(1, int(round(width * scale))),
+                       max(1, int(round(height * scale))), paint_format)
+        painter = QPainter(image)
+        if scale != 1.0:
+            # Rounding may leave a row or column uncovered
+            image.fill(QtCore.Qt.white)
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.scale(scale, scale)
+        painter.translate(-x, -y)
+        self.main_frame.render(painter, QRegion(x, y, width, height))
+        painter.end()
+
+        if paint_format != format:
+            image = image.convertToFormat(format)
+        return image
+
+    def _set_element_value(self, element, value, blur=True, group=None):
+        """Sets the value of a field element, see `set_field_value`.
+
+        :param element: The QWebElement of the field.
+        :param value: The value to fill in.
+        :param blur: An optional boolean that force blur when filled in.
+        :param group: A callable returning the elements of the checkboxes
+            or radios group `element` belongs to, defaults to the fields
+            sharing its name in its form.
+        """
+        if group is None:
+            group = partial(self._field_group, element)
+
+        def _set_checkbox_value(el, value):
+            el.setFocus()
+            if value is True:
+                el.setAttribute('checked', 'checked')
+            else:
+                el.removeAttribute('checked')
+
+        def _set_checkboxes_value(els, value):
+            for el in els:
+                if el.attribute('value') == value:
+                    _set_checkbox_value(el, True)
+                else:
+                    _set_checkbox_value(el, False)
+
+        def _set_radio_value(els, value):
+            for el in els:
+                if el.attribute('value') == value:
+                    el.setFocus()
+                    el.setAttribute('checked', 'checked')
+
+        def _set_text_value(el, value):
+            el.setFocus()
+            el.setAttribute('value', value)
+
+        def _set_select_value(el, value):
+            el.setFocus()
+            index = 0
+            for option in el.findAll('option'):
+                if option.attribute('value') == value:
+                    option.evaluateJavaScript('this.selected = true;')
+                    el.evaluateJavaScript('this.selectedIndex = %d;' % index)
+                    break
+                index += 1
+
+        def _set_textarea_value(el, value):
+            el.setFocus()
+            el.setPlainText(value)
+
+        res, resources = None, []
+        tag_name = str(element.tagName()).lower()
+
+        if tag_name == "select":
+            _set_select_value(element, value)
+        elif tag_name == "textarea":
+            _set_textarea_value(element, value)
+        elif tag_name == "input":
+            type_ = str(element.attribute('type')).lower()
+            if type_ in [
+                "color",
+                "date",
+                "datetime",
+                "datetime-local",
+                "email",
+                "hidden",
+                "month",
+                "number",
+                "password",
+                "range",
+                "search",
+                "tel",
+                "text",
+                "time",
+                "url",
+                "week",
+                "",
+            ]:
+                _set_text_value(element, value)
+            elif type_ == "checkbox":
+                els = list(group())
+                if len(els) > 1:
+                    _set_checkboxes_value(els, value)
+                else:
+                    _set_checkbox_value(element, value)
+            elif type_ == "radio":
+                _set_radio_value(group(), value)
+            elif type_ == "file":
+                self._upload_file = value
+                res, resources = (
+                    self._invoke_on(element, 'clickElement', 0),
+                    self._release_last_resources(),
+                )
+
+                self._upload_file = None
+        else:
+            raise Error('unsupported field tag')
+
+        for event in ['input', 'change']:
+            self._invoke_on(element, 'fireElement', event)
+
+        if blur:
+            self._invoke_on(element, 'callElement', 'blur')
+
+        return res, resources
+
+    def _set_scrollbar_policy(self, policy, frame=None):
+        """Sets frame scrollbar policy for both orientations.
+
+        :param policy: The Qt.ScrollBarPolicy to apply.
+        :param frame: The target frame, defaults to page main frame.
+        """
+        frame = frame or self.page.mainFrame()
+        frame.setScrollBarPolicy(QtCore.Qt.Vertical, policy)
+        frame.setScrollBarPolicy(QtCore.Qt.Horizontal, policy)
+
     def _page_loaded(self):
         """Called back when page is loaded.
         """
@@ -1470,6 +2869,29 @@ class Session(object):
         """Called back when page load started.
         """
         self.loaded = False
+        self._content_cache = None
+        self._load_count += 1
+
+    def _pdf_printer(self, paper_size, paper_margins, paper_units=None):
+        """Returns a QPrinter configured for pdf output.
+
+        :param paper_size: A 2-tuple indicating size of page to print to.
+        :param paper_margins: A 4-tuple indicating size of each margin.
+        :param paper_units: Units for pager_size, pager_margins.
+        """
+        assert len(paper_size) == 2
+        assert len(paper_margins) == 4
+
+        if paper_units is None:
+            paper_units = QPrinter.Inch
+
+        printer = QPrinter(mode=QPrinter.ScreenResolution)
+        printer.setOutputFormat(QPrinter.PdfFormat)
+        printer.setPaperSize(QtCore.QSizeF(*paper_size), paper_units)
+        printer.setPageMargins(*(paper_margins + (paper_units,)))
+        if paper_margins != (0, 0, 0, 0):
+            printer.setFullPage(True)
+        return printer
 
     def _release_last_resources(self):
         """Releases last loaded resources.
@@ -1508,6 +2930,15 @@ class Session(object):
         reply_ready_read(reply)
         reply.readyRead.connect(partial(reply_ready_read, reply))
 
+    def _window_object_cleared(self, frame):
+        """Called back when `frame` javascript window object is cleared,
+        before any page script runs.
+        """
+        frame.addToJavaScriptWindowObject('__ghostBridge', self.bridge)
+        frame.evaluateJavaScript(_helpers_script)
+        for source in self.init_scripts:
+            frame.evaluateJavaScript(source)
+
     def _on_manager_ssl_errors(self, reply, errors):
         if self.ignore_ssl_errors:
             reply.ignoreSslErrors()
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+
+from xvfbwrapper import Xvfb
+
+from .ghost import Error, TimeoutError
+
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+logger = logging.getLogger('ghost.pool')
+logger.addHandler(logging.NullHandler())
+
+
+def _get_context():
+    """Returns a multiprocessing context that never forks Qt state.
+
+    Workers are spawned, thus the main script of the parent process is
+    imported again in each of them and must be guarded by
+    `if __name__ == '__main__'`.
+    """
+    if not hasattr(multiprocessing, 'get_context'):
+        # Forking a process running a QApplication is unsafe
+        raise Error('GhostPool requires python 3.4+ to spawn workers')
+    return multiprocessing.get_context('spawn')
+
+
+def _worker(index, tasks, results, ghost_kwargs, session_kwargs):
+    """Worker process main loop.
+
+    Runs its own `Ghost` and `Session`, then executes jobs received through
+    `tasks` until it gets None.
+    """
+    from .ghost import Ghost
+
+    ghost = Ghost(**ghost_kwargs)
+    session = ghost.start(**session_kwargs)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+
+            job_id, func, args, kwargs = task
+            try:
+                # Pickle now so that unpicklable results fail the job instead
+                # of being silently dropped by the queue feeder thread.
+                payload = True, pickle.dumps(
+                    func(session, *args, **kwargs),
+                    pickle.HIGHEST_PROTOCOL,
+                )
+            except Exception:
+                payload = False, traceback.format_exc()
+            results.put((index, job_id) + payload)
+
+            try:
+                session.reset()
+            except Error:
+                session.exit()
+                session = ghost.start(**session_kwargs)
+    finally:
+        session.exit()
+        ghost.exit()
+
+
+class DisplayPool(object):
+    """`DisplayPool` pre-launches Xvfb display servers that many `Ghost`
+    processes can attach to, see `Ghost` display parameter.
+
+    :param size: The number of display servers to launch.
+    :param width: The screen width.
+    :param height: The screen height.
+    """
+    def __init__(self, size=1, width=800, height=600):
+        original_display = os.environ.get('DISPLAY')
+        self._servers = []
+        try:
+            for _ in range(size):
+                xvfb = Xvfb(width=width, height=height)
+                xvfb.start()
+                self._servers.append(xvfb)
+        except (OSError, RuntimeError):
+            self.close()
+            raise Error('Xvfb is required to launch display servers')
+        finally:
+            # Xvfb.start() exports DISPLAY, leave this process untouched
+            if original_display is None:
+                os.environ.pop('DISPLAY', None)
+            else:
+                os.environ['DISPLAY'] = original_display
+
+        self.displays = [':%d' % xvfb.new_display for xvfb in self._servers]
+        logger.info('Launched displays %s', ', '.join(self.displays))
+
+    def get(self, index):
+        """Returns the display to use for given worker index."""
+        return self.displays[index % len(self.displays)]
+
+    def close(self):
+        """Terminates display servers."""
+        original_display = os.environ.get('DISPLAY')
+        while self._servers:
+            xvfb = self._servers.pop()
+            # Xvfb.stop() restores or deletes DISPLAY, make sure it exists
+            os.environ['DISPLAY'] = ':%d' % xvfb.new_display
+            xvfb.stop()
+        if original_display is None:
+            os.environ.pop('DISPLAY', None)
+        else:
+            os.environ['DISPLAY'] = original_display
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SessionPool(object):
+    """`SessionPool` hands out pre-built sessions of a `Ghost` instance and
+    resets them when they are released, which is much cheaper than building
+    a new `Session` for each job.
+
+    :param ghost: The parent `Ghost` instance.
+    :param size: The number of idle sessions to build upfront and keep.
+    :param kwargs: The arguments to pass to new sessions.
+    """
+    def __init__(self, ghost, size=1, **kwargs):
+        self.ghost = ghost
+        self.size = size
+        self.kwargs = kwargs
+        self._idle = [ghost.start(**kwargs) for _ in range(size)]
+
+    def acquire(self):
+        """Returns an idle session, or a new one if none is available."""
+        if self._idle:
+            return self._idle.pop()
+        return self.ghost.start(**self.kwargs)
+
+    def release(self, session):
+        """Resets `session` and makes it available again.
+
+        Sessions that fail to reset or exceed pool size are exited.
+        """
+        if len(self._idle) < self.size:
+            try:
+                session.reset()
+            except Error:
+                logger.warning('Unable to reset session %s', session.id)
+            else:
+                self._idle.append(session)
+                return
+        session.exit()
+
+    @contextmanager
+    def session(self):
+        """Statement that acquires a session and releases it afterwards."""
+        session = self.acquire()
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def close(self):
+        """Exits idle sessions."""
+        while self._idle:
+            self._idle.pop().exit()
+
+
+class _Worker(object):
+    """Parent side state of a worker process."""
+    def __init__(self, index, process, tasks):
+        self.index = index
+        self.process = process
+        self.tasks = tasks
+        self.job = None
+
+
+class GhostPool(object):
+    """`GhostPool` distributes jobs over worker processes, each of them
+    running its own `Ghost` instance and `Session`.
+
+    Jobs are picklable callables receiving the worker session as first
+    argument, their return value must be picklable too. Crashed workers
+    are restarted and their job fails with an `Error`. Workers are spawned
+    (python 3.4+), so the main script must be guarded by
+    `if __name__ == '__main__'`.
+
+    :param processes: The number of workers, defaults to the number of CPUs.
+    :param ghost_kwargs: The arguments to pass to workers' `Ghost`.
+    :param session_kwargs: The arguments to pass to workers' `Session`.
+    :param poll_interval: Delay in seconds between two workers checks.
+    :param displays: An optional `DisplayPool` that workers attach to
+        instead of launching their own display server.
+    """
+    def __init__(
+        self,
+        processes=None,
+        ghost_kwargs=None,
+        session_kwargs=None,
+        poll_interval=0.1,
+        displays=None,
+    ):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.ghost_kwargs = ghost_kwargs or dict()
+        self.session_kwargs = session_kwargs or dict()
+        self.poll_interval = poll_interval
+        self.displays = displays
+
+        self._context = _get_context()
+        self._results = self._context.Queue()
+        self._backlog = deque()
+        self._done = {}
+        self._ids = itertools.count()
+        self._workers = [
+            self._start_worker(index) for index in range(self.processes)
+        ]
+
+    def _start_worker(self, index):
+        ghost_kwargs = dict(self.ghost_kwargs)
+        if self.displays is not None:
+            ghost_kwargs['display'] = self.displays.get(index)
+
+        tasks = self._context.Queue()
+        process = self._context.Process(
+            target=_worker,
+            args=(index, tasks, self._results, ghost_kwargs,
+                  self.session_kwargs),
+        )
+        process.daemon = True
+        process.start()
+        logger.info('Started worker %s (pid %s)', index, process.pid)
+        return _Worker(index, process, tasks)
+
+    def submit(self, func, *args, **kwargs):
+        """Queues a job.
+
+        :param func: A picklable callable taking a `Session` as first
+            argument.
+        :return: The job identifier.
+        """
+        job_id = next(self._ids)
+        self._backlog.append((job_id, func, args, kwargs))
+        self._dispatch()
+        return job_id
+
+    def result(self, job_id, timeout=None):
+        """Waits for job completion and returns its result.
+
+        :param job_id: The job identifier returned by `submit`.
+        :param timeout: An optional timeout.
+        """
+        started_at = time.time()
+        while job_id not in self._done:
+            if timeout is not None and time.time() > (started_at + timeout):
+                raise TimeoutError('Job %s is not complete' % job_id)
+            self._poll()
+        return self._unpack(self._done.pop(job_id))
+
+    def map(self, func, iterable, timeout=None):
+        """Runs `func` on each item of `iterable` and returns results in
+        order.
+
+        :param func: A picklable callable taking a `Session` and an item.
+        :param iterable: The items.
+        :param timeout: An optional timeout per job.
+        """
+        job_ids = [self.submit(func, item) for item in iterable]
+        return [self.result(job_id, timeout) for job_id in job_ids]
+
+    def imap_unordered(self, func, iterable):
+        """Runs `func` on each item of `iterable` and yields results as they
+        complete.
+
+        :param func: A picklable callable taking a `Session` and an item.
+        :param iterable: The items.
+        """
+        job_ids = set(self.submit(func, item) for item in iterable)
+        while job_ids:
+            for job_id in job_ids.intersection(self._done):
+                job_ids.remove(job_id)
+                yield self._unpack(self._done.pop(job_id))
+            if job_ids:
+                self._poll()
+
+    def close(self):
+        """Waits for submitted jobs, then stops workers."""
+        while self._backlog or any(w.job is not None for w in self._workers):
+            self._poll()
+        for worker in self._workers:
+            worker.tasks.put(None)
+        for worker in self._workers:
+            worker.process.join()
+        self._workers = []
+
+    def terminate(self):
+        """Stops workers immediately."""
+        for worker in getattr(self, '_workers', []):
+            worker.process.terminate()
+            worker.process.join()
+        self._workers = []
+
+    def _unpack(self, result):
+        ok, payload = result
+        if not ok:
+            raise Error('Job failed in worker:\n%s' % payload)
+        return pickle.loads(payload)
+
+    def _dispatch(self):
+        for worker in self._workers:
+            if not self._backlog:
+                return
+            if worker.job is None:
+                task = self._backlog.popleft()
+                worker.job = task[0]
+                worker.tasks.put(task)
+
+    def _poll(self):
+        try:
+            index, job_id, ok, payload = self._results.get(
+                timeout=self.poll_interval)
+        except Empty:
+            pass
+        else:
+            worker = self._workers[index]
+            # Ignore results sent by a worker that died since then
+            if worker.job == job_id:
+                self._done[job_id] = (ok, payload)
+                worker.job = None
+        self._supervise()
+        self._dispatch()
+
+    def _supervise(self):
+        """Restarts dead workers, failing their running job."""
+        for worker in list(self._workers):
+            if worker.process.is_alive():
+                continue
+
+            logger.warning('Worker %s (pid %s) died with exit code %s',
+                           worker.index, worker.process.pid,
+                           worker.process.exitcode)
+            if worker.job is not None:
+                self._done[worker.job] = (
+                    False,
+                    'Worker %s died with exit code %s' % (
+                        worker.process.pid, worker.process.exitcode),
+                )
+            self._workers[worker.index] = self._start_worker(worker.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+
+    def __del__(self):
+        self.terminate()
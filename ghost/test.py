@@ -7,8 +7,6 @@ import time
 from unittest import TestCase
 from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
 
-from ghost import Ghost
-
 PY3 = sys.version_info[0] > 2
 
 
@@ -104,9 +102,15 @@ class BaseGhostTestCase(TestCase):
     display = False
     wait_timeout = 5
     viewport_size = (800, 600)
+    # Reset and reuse sessions between tests instead of building new ones
+    reuse_sessions = False
 
     def __new__(cls, *args, **kwargs):
         """Creates Ghost instance."""
+        # Imported here so that test helpers do not load Qt bindings
+        from .ghost import Ghost
+        from .pool import SessionPool
+
         if not hasattr(cls, 'ghost'):
             cls.ghost = Ghost(
                 defaults=dict(
@@ -116,6 +120,9 @@ class BaseGhostTestCase(TestCase):
                 )
             )
 
+        if cls.reuse_sessions and not hasattr(cls, 'session_pool'):
+            cls.session_pool = SessionPool(cls.ghost)
+
         return super(BaseGhostTestCase, cls).__new__(cls)
 
     def __call__(self, result=None):
@@ -131,12 +138,18 @@ class BaseGhostTestCase(TestCase):
 
     def _post_teardown(self):
         """Deletes ghost cookies and hide UI if needed."""
-        self.session.exit()
+        if self.reuse_sessions:
+            self.session_pool.release(self.session)
+        else:
+            self.session.exit()
 
     def _pre_setup(self):
         """Shows UI if needed.
         """
-        self.session = self.ghost.start()
+        if self.reuse_sessions:
+            self.session = self.session_pool.acquire()
+        else:
+            self.session = self.ghost.start()
         if self.display:
             self.session.show()
 
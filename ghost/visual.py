@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""Screenshot comparison against stored baselines.
+
+.. code:: python
+
+    comparator = VisualComparator(session, 'tests/baselines', tolerance=8)
+    diff = comparator.check('home', ignore=['#clock'])
+    assert diff.passed, diff
+"""
+import os
+import sys
+
+try:
+    import numpy
+except ImportError:
+    raise Exception("Ghost.py visual comparison requires numpy...")
+
+from .bindings import QImage
+from .ghost import Error, image_to_array
+
+# Channel indices of native byte order arrays, see `image_to_array`
+if sys.byteorder == 'little':
+    _BLUE, _GREEN, _RED, _ALPHA = 0, 1, 2, 3
+else:
+    _ALPHA, _RED, _GREEN, _BLUE = 0, 1, 2, 3
+
+# Neighbour offsets searched for anti-aliasing
+_NEIGHBOURS = [
+    (dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx
+]
+
+
+def array_to_image(array):
+    """Returns a QImage copy of a (height, width, 4) uint8 array in native
+    byte order, see `image_to_array`.
+    """
+    array = numpy.ascontiguousarray(array, dtype=numpy.uint8)
+    height, width = array.shape[:2]
+    data = array.tobytes()
+    # QImage does not own `data`, copy it while it is alive
+    return QImage(data, width, height, width * 4,
+                  QImage.Format_ARGB32).copy()
+
+
+def load_array(path):
+    """Loads image file at `path` as a (height, width, 4) uint8 array."""
+    image = QImage(path)
+    if image.isNull():
+        raise Error("Can't load image %s" % path)
+    return image_to_array(image)
+
+
+def _shift(array, dy, dx):
+    """Returns `array` shifted by (dy, dx), edges being replicated."""
+    height, width = array.shape[:2]
+    rows = numpy.clip(numpy.arange(height) + dy, 0, height - 1)
+    cols = numpy.clip(numpy.arange(width) + dx, 0, width - 1)
+    return array[rows][:, cols]
+
+
+def _distance(a, b):
+    """Returns per pixel maximum channel difference of two int16 arrays."""
+    return numpy.abs(a - b).max(axis=2)
+
+
+def _edges(array):
+    """Returns a boolean array of pixels lying on an edge: having both
+    darker and brighter neighbours, and at most two equal ones, as
+    anti-aliased pixels do.
+    """
+    luminance = (array[..., _RED] * 0.299 + array[..., _GREEN] * 0.587 +
+                 array[..., _BLUE] * 0.114)
+
+    darker = numpy.zeros(luminance.shape, dtype=bool)
+    brighter = numpy.zeros(luminance.shape, dtype=bool)
+    equal = numpy.zeros(luminance.shape, dtype=numpy.int8)
+    for dy, dx in _NEIGHBOURS:
+        delta = _shift(luminance, dy, dx) - luminance
+        darker |= delta < 0
+        brighter |= delta > 0
+        equal += delta == 0
+    return darker & brighter & (equal <= 2)
+
+
+class Diff(object):
+    """Result of an image comparison.
+
+    :param mask: Boolean (height, width) array of differing pixels.
+    :param delta: Per pixel maximum channel difference.
+    :param antialiased: Boolean array of differences explained by
+        anti-aliasing, not counted in `mask`.
+    :param block_size: The side of blocks `blocks` is computed on.
+    :param max_ratio: The ratio of differing pixels tolerated.
+    """
+    def __init__(self, mask, delta, antialiased, block_size, max_ratio):
+        self.mask = mask
+        self.delta = delta
+        self.antialiased = antialiased
+        self.block_size = block_size
+        self.max_ratio = max_ratio
+        self.path = None
+
+    @property
+    def count(self):
+        """Number of differing pixels."""
+        return int(self.mask.sum())
+
+    @property
+    def ratio(self):
+        """Ratio of differing pixels."""
+        return float(self.count) / (self.mask.size or 1)
+
+    @property
+    def passed(self):
+        return self.ratio <= self.max_ratio
+
+    @property
+    def blocks(self):
+        """Ratio of differing pixels per block, as a 2 dimensions array."""
+        height, width = self.mask.shape
+        rows = numpy.arange(0, height, self.block_size)
+        cols = numpy.arange(0, width, self.block_size)
+        counts = numpy.add.reduceat(
+            numpy.add.reduceat(self.mask.astype(numpy.int64), rows, axis=0),
+            cols,
+            axis=1,
+        )
+        areas = numpy.outer(
+            numpy.diff(numpy.append(rows, height)),
+            numpy.diff(numpy.append(cols, width)),
+        )
+        return counts / areas.astype(float)
+
+    def heatmap(self, image):
+        """Returns a (height, width, 4) array showing differences in red,
+        proportionally to their intensity, and anti-aliasing in yellow over
+        a faded `image`.
+
+        :param image: The (height, width, 4) array to draw over.
+        """
+        colors = (_RED, _GREEN, _BLUE)
+        gray = image[..., colors].mean(axis=2)
+        faded = (255 - (255 - gray) * 0.3).astype(numpy.uint8)
+        heat = numpy.empty(image.shape, dtype=numpy.uint8)
+        for channel in colors:
+            heat[..., channel] = faded
+        heat[..., _ALPHA] = 255
+
+        intensity = (255 - numpy.clip(self.delta, 0, 255)).astype(
+            numpy.uint8)
+        for channel, value in ((_RED, 255), (_GREEN, 255), (_BLUE, 0)):
+            heat[..., channel][self.antialiased] = value
+        heat[..., _RED][self.mask] = 255
+        heat[..., _GREEN][self.mask] = intensity[self.mask]
+        heat[..., _BLUE][self.mask] = intensity[self.mask]
+        return heat
+
+    def __repr__(self):
+        return '<Diff %d pixels (%.4f%%)>' % (self.count, self.ratio * 100)
+
+
+def compare(
+    actual,
+    expected,
+    tolerance=0,
+    antialiasing=True,
+    ignore=(),
+    block_size=16,
+    max_ratio=0,
+):
+    """Compares two (height, width, 4) uint8 arrays.
+
+    :param actual: The array to check.
+    :param expected: The reference array.
+    :param tolerance: The maximum channel difference of similar pixels.
+    :param antialiasing: Don't count differing pixels lying on an edge
+        and matching one of their neighbours in the other image, as
+        anti-aliasing does.
+    :param ignore: An iterable of (x1, y1, x2, y2) regions to ignore.
+    :param block_size: The side of blocks `Diff.blocks` is computed on.
+    :param max_ratio: The ratio of differing pixels tolerated.
+    """
+    if actual.shape != expected.shape:
+        raise Error('Image sizes differ: %s != %s'
+                    % (actual.shape[:2], expected.shape[:2]))
+
+    actual = actual.astype(numpy.int16)
+    expected = expected.astype(numpy.int16)
+    delta = _distance(actual, expected)
+    mask = delta > tolerance
+
+    for x1, y1, x2, y2 in ignore:
+        mask[max(y1, 0):max(y2, 0), max(x1, 0):max(x2, 0)] = False
+
+    antialiased = numpy.zeros(mask.shape, dtype=bool)
+    if antialiasing and mask.any():
+        # A pixel is anti-aliased when it lies on an edge and is close to
+        # some neighbour of the other image, both ways. Edges keep shifted
+        # content, whose pixels all match a neighbour, from passing.
+        matches = [numpy.zeros(mask.shape, dtype=bool) for _ in range(2)]
+        for dy, dx in _NEIGHBOURS:
+            matches[0] |= _distance(
+                actual, _shift(expected, dy, dx)) <= tolerance
+            matches[1] |= _distance(
+                expected, _shift(actual, dy, dx)) <= tolerance
+        antialiased = mask & matches[0] & matches[1] & \
+            (_edges(actual) | _edges(expected))
+        mask &= ~antialiased
+
+    return Diff(mask, delta, antialiased, block_size, max_ratio)
+
+
+class VisualComparator(object):
+    """Compares session snapshots with baselines stored as PNG files.
+
+    Missing baselines are created from the current snapshot. On failure,
+    the snapshot and a diff heatmap are saved next to the baseline as
+    `<name>.actual.png` and `<name>.diff.png`.
+
+    :param session: The `Session` to capture.
+    :param directory: The baselines directory.
+    :param kwargs: Default `compare` arguments.
+    """
+    def __init__(self, session, directory, **kwargs):
+        self.session = session
+        self.directory = directory
+        self.kwargs = kwargs
+
+    def check(self, name, selector=None, ignore=(), **kwargs):
+        """Compares current snapshot with baseline `name`.
+
+        :param name: The baseline name.
+        :param selector: An optional selector of the element to capture.
+        :param ignore: An iterable of selectors of elements to ignore.
+        :param kwargs: Extra `compare` arguments.
+        :return: A `Diff` or None when the baseline was just created.
+        """
+        actual = self.session.capture_array(selector=selector)
+        path = os.path.join(self.directory, '%s.png' % name)
+
+        if not os.path.exists(path):
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            array_to_image(actual).save(path)
+            return None
+
+        left, top = 0, 0
+        if selector is not None:
+            left, top = self.session.region_for_selector(selector)[:2]
+
+        options = dict(self.kwargs, **kwargs)
+        # Selector regions include their right and bottom pixels
+        options['ignore'] = list(options.get('ignore', ())) + [
+            (x1 - left, y1 - top, x2 + 1 - left, y2 + 1 - top)
+            for x1, y1, x2, y2 in (
+                self.session.region_for_selector(ignored)
+                for ignored in ignore
+            )
+        ]
+
+        diff = compare(actual, load_array(path), **options)
+        if not diff.passed:
+            base = os.path.join(self.directory, name)
+            array_to_image(actual).save('%s.actual.png' % base)
+            diff.path = '%s.diff.png' % base
+            array_to_image(diff.heatmap(actual)).save(diff.path)
+        return diff
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Micro benchmarks, not part of the test suite.
+
+Run them all with ``python -m tests.benchmarks`` or some of them with
+``python -m tests.benchmarks session_setup``.
+"""
+from __future__ import absolute_import, print_function
+
+import resource
+import subprocess
+import sys
+import time
+
+from ghost import Ghost, SessionPool
+from ghost.test import ServerThread
+
+from .app import app
+
+PORT = 5001
+
+base_url = 'http://localhost:%s/' % PORT
+
+BENCHMARKS = []
+
+
+def benchmark(func):
+    """Registers `func` as a benchmark."""
+    BENCHMARKS.append(func)
+    return func
+
+
+def timeit(func, number):
+    """Returns mean duration of `func` calls in milliseconds."""
+    started_at = time.time()
+    for _ in range(number):
+        func()
+    return (time.time() - started_at) * 1000 / number
+
+
+def report(name, duration, baseline=None):
+    if baseline:
+        print('  %-40s %10.3f ms  (x%.1f)' % (name, duration,
+                                            baseline / duration))
+    else:
+        print('  %-40s %10.3f ms' % (name, duration))
+
+
+@benchmark
+def session_setup(ghost, number=50):
+    """Full session construction versus pooled session reset."""
+    def build():
+        ghost.start().exit()
+
+    pool = SessionPool(ghost)
+
+    def reuse():
+        pool.release(pool.acquire())
+
+    baseline = timeit(build, number)
+    report('Session construction', baseline)
+    report('SessionPool acquire/release', timeit(reuse, number), baseline)
+    pool.close()
+
+
+@benchmark
+def session_memory(ghost, number=50):
+    """Peak resident memory growth per headless session."""
+    started_with = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    sessions = [ghost.start() for _ in range(number)]
+    grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - started_with
+    print('  %-40s %10.1f kB' % ('Session peak RSS growth', grown / number))
+    for session in sessions:
+        session.exit()
+
+
+@benchmark
+def import_time(ghost, number=10):
+    """Interpreter startup with `import ghost` versus full Qt loading."""
+    def run(code):
+        return lambda: subprocess.check_call([sys.executable, '-c', code])
+
+    baseline = timeit(run('import ghost; ghost.Ghost'), number)
+    report('import ghost; ghost.Ghost', baseline)
+    report('import ghost', timeit(run('import ghost'), number), baseline)
+    report('import ghost.test', timeit(run('import ghost.test'), number),
+           baseline)
+
+
+@benchmark
+def fill(ghost, number=20):
+    """Per field form filling versus batched filling."""
+    values = {
+        'text': 'Here is a sample text.',
+        'email': 'my@awesome.email',
+        'textarea': 'Here is a sample text.',
+        'checkbox': True,
+        'select': 'two',
+        'radio': 'first choice',
+    }
+    session = ghost.start()
+    session.open(base_url)
+    baseline = timeit(lambda: session.fill('form', values), number)
+    report('fill', baseline)
+    report('fill(batch=True)',
+           timeit(lambda: session.fill('form', values, batch=True), number),
+           baseline)
+    session.exit()
+
+
+@benchmark
+def helpers(ghost, number=500):
+    """Compiled script per call versus injected helper invocation."""
+    session = ghost.start()
+    session.open(base_url)
+    baseline = timeit(lambda: session.main_frame.evaluateJavaScript(
+        '!(typeof this["myGlobal"] === "undefined");'), number)
+    report('evaluateJavaScript(script)', baseline)
+    report('global_exists()',
+           timeit(lambda: session.global_exists('myGlobal'), number),
+           baseline)
+    session.exit()
+
+
+@benchmark
+def extract(ghost, number=50):
+    """Per element attribute reads versus single pass extraction."""
+    session = ghost.start()
+    session.open(base_url)
+
+    def loop():
+        return [
+            (element.toPlainText(), element.attribute('value'))
+            for element in session.main_frame.findAllElements('[name]')
+        ]
+
+    baseline = timeit(loop, number)
+    report('findAllElements() + attribute()', baseline)
+    report('extract()', timeit(lambda: session.extract({
+        'fields': {
+            'selector': '[name]',
+            'fields': {'text': 'text', 'value': '@value'},
+        },
+    }), number), baseline)
+    session.exit()
+
+
+@benchmark
+def query(ghost, number=50):
+    """Selector based interactions versus an element handle."""
+    session = ghost.start()
+    session.open(base_url)
+
+    def by_selector():
+        session.set_field_value('#text', 'value')
+        session.fire('#text', 'focus')
+        session.call('#text', 'blur')
+
+    def by_handle():
+        field = session.query('#text')
+        field.fill('value')
+        field.fire('focus')
+        field.call('blur')
+
+    baseline = timeit(by_selector, number)
+    report('set_field_value() + fire() + call()', baseline)
+    report('query() + handle methods', timeit(by_handle, number), baseline)
+    session.exit()
+
+
+@benchmark
+def evaluate(ghost, number=2000):
+    """Per call latency of evaluate versus evaluate_value."""
+    session = ghost.start()
+    session.open(base_url)
+    baseline = timeit(lambda: session.evaluate('1 + 1'), number)
+    report('evaluate()', baseline)
+    report('evaluate_value()',
+           timeit(lambda: session.evaluate_value('1 + 1'), number), baseline)
+    session.exit()
+
+
+@benchmark
+def content(ghost, number=200):
+    """Full serialization versus cached content of an unchanged page."""
+    session = ghost.start()
+    session.open(base_url + 'many-assets')
+    baseline = timeit(session.main_frame.toHtml, number)
+    report('toHtml()', baseline)
+    report('content', timeit(lambda: session.content, number), baseline)
+    session.exit()
+
+
+@benchmark
+def text(ghost, number=200):
+    """Plain text versus full HTML serialization."""
+    session = ghost.start()
+    session.open(base_url)
+    baseline = timeit(session.main_frame.toHtml, number)
+    report('toHtml()', baseline)
+    report('text()', timeit(session.text, number), baseline)
+    report('readable_text()', timeit(session.readable_text, number),
+           baseline)
+    session.exit()
+
+
+@benchmark
+def capture_bytes(ghost, number=20):
+    """Disk round trip versus in memory encoding."""
+    import os
+    import tempfile
+
+    session = ghost.start()
+    session.open(base_url)
+    path = os.path.join(tempfile.mkdtemp(), 'capture.png')
+
+    def to_disk():
+        session.capture_to(path)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    baseline = timeit(to_disk, number)
+    report('capture_to() + read()', baseline)
+    report('capture_bytes()', timeit(session.capture_bytes, number),
+           baseline)
+    report('capture_bytes(background=True)', timeit(
+        lambda: session.capture_bytes(background=True), number), baseline)
+    os.remove(path)
+    session.exit()
+
+
+@benchmark
+def capture_many(ghost, number=10):
+    """Capturing elements one by one versus in a single render pass."""
+    selectors = ['h1', 'h2', 'form', 'nav', '#list', 'img']
+    session = ghost.start()
+    session.open(base_url)
+    baseline = timeit(lambda: [session.capture(selector=selector)
+                               for selector in selectors], number)
+    report('capture(selector=...) x %d' % len(selectors), baseline)
+    report('capture_many()',
+           timeit(lambda: session.capture_many(selectors), number), baseline)
+    session.exit()
+
+
+@benchmark
+def print_to_pdf(ghost, number=20):
+    """Page by page pdf printing versus batched printing."""
+    import os
+    import shutil
+    import tempfile
+
+    session = ghost.start()
+    directory = tempfile.mkdtemp()
+    urls = [base_url, base_url + 'many-assets', base_url + 'echo/invoice']
+    items = [
+        {'path': os.path.join(directory, '%d.pdf' % i), 'url': url}
+        for i, url in enumerate(urls * number)
+    ]
+
+    def one_by_one():
+        for item in items:
+            session.open(item['url'])
+            session.print_to_pdf(item['path'])
+
+    baseline = timeit(one_by_one, 1) / len(items)
+    report('open() + print_to_pdf()', baseline)
+    report('print_many_to_pdf()', timeit(
+        lambda: list(session.print_many_to_pdf(items)), 1) / len(items),
+        baseline)
+    shutil.rmtree(directory)
+    session.exit()
+
+
+def main(names):
+    server = ServerThread(app, PORT)
+    server.daemon = True
+    server.start()
+    while not hasattr(server, 'http_server'):
+        time.sleep(0.01)
+
+    ghost = Ghost()
+    try:
+        for func in BENCHMARKS:
+            if names and func.__name__ not in names:
+                continue
+            print('%s: %s' % (func.__name__, func.__doc__))
+            func(ghost)
+    finally:
+        server.join()
+        ghost.exit()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -6,13 +6,25 @@ from __future__ import absolute_import
 import io
 import json
 import logging
+import multiprocessing
 import os
+import shutil
+import subprocess
 import sys
+import tempfile
 import unittest
-
-from ghost import GhostTestCase
-from ghost.bindings import BINDING_NAME
-from ghost.ghost import default_user_agent
+from distutils.spawn import find_executable
+
+from ghost import (
+    DisplayPool,
+    Error,
+    GhostPool,
+    GhostTestCase,
+    SessionPool,
+    StaleElementError,
+)
+from ghost.bindings import BINDING_NAME, QImage
+from ghost.ghost import default_user_agent, image_to_array
 
 from .app import app
 
@@ -27,6 +39,22 @@ PORT = 5000
 base_url = 'http://localhost:%s/' % PORT
 
 
+# GhostPool spawns its workers
+requires_spawn = unittest.skipUnless(
+    hasattr(multiprocessing, 'get_context'),
+    'Requires multiprocessing spawn context',
+)
+
+
+def _pool_title(session, url):
+    session.open(url)
+    return session.evaluate('document.title || document.body.textContent')[0]
+
+
+def _pool_crash(session):
+    os._exit(1)
+
+
 class GhostTest(GhostTestCase):
     port = PORT
     display = False
@@ -57,6 +85,17 @@ class GhostTest(GhostTestCase):
         self.session.open(base_url)
         self.assertEqual(self.session.evaluate("x='ghost'; x;")[0], 'ghost')
 
+    def test_evaluate_value(self):
+        self.session.open(base_url, wait=False)
+        self.session.wait_for(lambda: self.session.loaded,
+                              'Unable to load requested page')
+        self.assertEqual(self.session.evaluate_value("x='ghost'; x;"),
+                         'ghost')
+        self.assertNotEqual(self.session.http_resources, [])
+        resources = self.session.release_resources()
+        self.assertTrue(any(r.url == base_url for r in resources))
+        self.assertEqual(self.session.http_resources, [])
+
     def test_extra_resource_content(self):
         page, resources = self.session.open(base_url)
         self.assertEqual(len(resources), 6)
@@ -133,6 +172,46 @@ class GhostTest(GhostTestCase):
             'document.getElementById("radio-second").checked')
         self.assertEqual(value, False)
 
+    def test_fill_batch(self):
+        self.session.open(base_url)
+        values = {
+            'text': 'Here is a sample text.',
+            'email': 'my@awesome.email',
+            'textarea': 'Here is a sample text.\nWith several lines.',
+            'checkbox': True,
+            'multiple-checkbox': 'second choice',
+            'select': 'two',
+            "radio": "first choice"
+        }
+        self.session.fill('form', values, batch=True)
+        for field in ['text', 'email', 'textarea']:
+            value, resssources = self.session\
+                .evaluate('document.getElementById("%s").value' % field)
+            self.assertEqual(value, values[field])
+        value, resources = self.session.evaluate(
+            'document.getElementById("checkbox").checked')
+        self.assertEqual(value, True)
+        value, resources = self.session.evaluate(
+            'document.getElementById("multiple-checkbox-first").checked')
+        self.assertEqual(value, False)
+        value, resources = self.session.evaluate(
+            'document.getElementById("multiple-checkbox-second").checked')
+        self.assertEqual(value, True)
+        value, resources = self.session.evaluate(
+            "document.querySelector('option[value=two]').selected;")
+        self.assertTrue(value)
+        value, resources = self.session.evaluate(
+            'document.getElementById("radio-first").checked')
+        self.assertEqual(value, True)
+        value, resources = self.session.evaluate(
+            'document.getElementById("radio-second").checked')
+        self.assertEqual(value, False)
+
+    def test_fill_batch_missing_field(self):
+        self.session.open(base_url)
+        self.assertRaises(Error, self.session.fill, 'form',
+                          {'undefined': 'value'}, batch=True)
+
     def test_form_submission(self):
         self.session.open(base_url)
         values = {
@@ -150,6 +229,96 @@ class GhostTest(GhostTestCase):
         self.session.open("%s" % base_url)
         self.assertTrue(self.session.global_exists('myGlobal'))
 
+    def test_helpers_injected_in_frames(self):
+        self.session.open(base_url)
+        self.assertTrue(self.session.global_exists('__ghost'))
+        self.session.frame('first-frame')
+        self.assertTrue(self.session.global_exists('__ghost'))
+
+    def test_helpers_reinjected_when_removed(self):
+        self.session.open(base_url)
+        self.session.evaluate('delete window.__ghost;')
+        self.assertTrue(self.session.global_exists('myGlobal'))
+        self.assertTrue(self.session.global_exists('__ghost'))
+
+    def test_helpers_arguments_are_data(self):
+        self.session.open(base_url)
+        self.assertFalse(self.session.global_exists('"] + alert(1) + ["'))
+        self.assertEqual(self.session.popup_messages, [])
+
+    def test_init_script(self):
+        script = 'window.initialized = typeof myGlobal === "undefined";'
+        self.session.add_init_script(script)
+        self.session.open(base_url)
+        self.assertEqual(self.session.evaluate_value('initialized'), True)
+        self.session.frame('first-frame')
+        self.assertEqual(self.session.evaluate_value('initialized'), True)
+        self.session.frame()
+        self.session.remove_init_script(script)
+        self.session.open(base_url)
+        self.assertFalse(self.session.global_exists('initialized'))
+
+    def test_data_handler(self):
+        batches = []
+        self.session.open(base_url)
+        self.session.add_data_handler('items', batches.append)
+        count, resources = self.session.evaluate("""
+            var items = [];
+            for (var i = 0; i < 2500; i++) {
+                items.push(i);
+            }
+            __ghost.send('items', items, 1000, function (item) {
+                return {value: item};
+            });
+        """)
+        self.assertEqual(count, 2500)
+        self.assertEqual([len(batch) for batch in batches], [1000, 1000, 500])
+        self.assertEqual(batches[2][-1], {'value': 2499})
+        self.session.remove_data_handler('items')
+        self.session.evaluate("__ghost.send('items', [1]);")
+        self.assertEqual(len(batches), 3)
+
+    def test_extract(self):
+        self.session.open(base_url)
+        data = self.session.extract({
+            'options': {
+                'selector': '#select option',
+                'fields': {'label': 'text', 'value': '@value',
+                           'selected': '.selected'},
+            },
+            'paragraphs': {
+                'selector': 'fieldset p',
+                'fields': {'label': ('label', 'text'),
+                           'missing': ('.undefined', 'text')},
+            },
+        })
+        self.assertEqual(data['options'], [
+            {'label': 'one', 'value': 'one', 'selected': True},
+            {'label': 'two', 'value': 'two', 'selected': False},
+        ])
+        self.assertEqual(data['paragraphs'][0],
+                         {'label': 'text', 'missing': None})
+
+    def test_helper_errors(self):
+        self.session.open(base_url)
+        self.session.evaluate(
+            'window.calls = 0; document.body.fail = function () {'
+            ' window.calls++; throw new Error("boom"); };')
+        with self.assertRaises(Error) as context:
+            self.session.call('body', 'fail')
+        self.assertIn('boom', str(context.exception))
+        value, resources = self.session.evaluate('window.calls')
+        self.assertEqual(value, 1)
+        self.assertRaises(Error, self.session.extract, {
+            'links': {'selector': '!invalid', 'fields': {'text': 'text'}},
+        })
+
+    def test_extract_unsupported_field(self):
+        self.session.open(base_url)
+        self.assertRaises(ValueError, self.session.extract, {
+            'links': {'selector': 'a', 'fields': {'url': 'href'}},
+        })
+
     def test_resource_headers(self):
         page, resources = self.session.open(base_url)
         self.assertEqual(
@@ -272,6 +441,219 @@ class GhostTest(GhostTestCase):
         self.assertTrue(os.path.isfile('test.png'))
         os.remove('test.png')
 
+    def test_capture_array(self):
+        try:
+            import numpy
+        except ImportError:
+            raise unittest.SkipTest('Requires numpy')
+
+        self.session.open("%secho/array" % base_url)
+        array = self.session.capture_array()
+        self.assertEqual(array.dtype, numpy.uint8)
+        self.assertEqual(array.shape[2], 4)
+        size = self.session.capture().size()
+        self.assertEqual(array.shape[:2], (size.height(), size.width()))
+        self.assertFalse(array.flags.writeable)
+        rgb = self.session.capture_array(region=(0, 0, 10, 20), rgb=True)
+        self.assertEqual(rgb.shape, (20, 10, 3))
+        self.assertEqual(list(rgb[5, 5]), [0x33, 0x33, 0x33])
+
+    def test_visual_compare(self):
+        try:
+            import numpy
+        except ImportError:
+            raise unittest.SkipTest('Requires numpy')
+        from ghost.visual import VisualComparator, compare
+
+        self.session.open(base_url)
+        baseline = self.session.capture_array()
+        self.assertEqual(compare(baseline, baseline).count, 0)
+
+        actual = baseline.copy()
+        actual[10:20, 10:20] = (0, 0, 255, 255)
+        diff = compare(actual, baseline)
+        self.assertEqual(diff.count, 100)
+        self.assertFalse(diff.passed)
+        self.assertEqual(diff.blocks[0, 0], 36 / 256.)
+        self.assertTrue(compare(actual, baseline, tolerance=255).passed)
+        self.assertTrue(
+            compare(actual, baseline, ignore=[(10, 10, 20, 20)]).passed)
+        self.assertEqual(diff.heatmap(actual).shape, actual.shape)
+
+        # A 1px layout shift is not anti-aliasing
+        expected = numpy.full((20, 20, 4), 255, dtype=numpy.uint8)
+        shifted = expected.copy()
+        expected[5:15, 5:15, :3] = 0
+        shifted[5:15, 6:16, :3] = 0
+        self.assertEqual(compare(shifted, expected).count, 20)
+
+        directory = tempfile.mkdtemp()
+        comparator = VisualComparator(self.session, directory)
+        self.assertIsNone(comparator.check('home'))
+        self.assertTrue(comparator.check('home').passed)
+        self.session.evaluate(
+            'document.querySelector("h1").textContent = "changed";')
+        self.assertFalse(comparator.check('home').passed)
+        self.assertTrue(os.path.isfile(os.path.join(directory,
+                                                    'home.diff.png')))
+        self.assertTrue(comparator.check('home', ignore=['h1']).passed)
+        shutil.rmtree(directory)
+
+    def test_capture_bytes(self):
+        self.session.open(base_url)
+        png = self.session.capture_bytes()
+        self.assertIsInstance(png, bytes)
+        self.assertTrue(png.startswith(b'\x89PNG'))
+        jpeg = self.session.capture_bytes('jpeg', quality=50, selector='h1')
+        self.assertTrue(jpeg.startswith(b'\xff\xd8'))
+        result = self.session.capture_bytes(background=True)
+        self.assertTrue(result.get(timeout=10).startswith(b'\x89PNG'))
+
+    def test_record(self):
+        directory = tempfile.mkdtemp()
+        with self.session.record(directory, fps=20) as recorder:
+            self.session.open(base_url)
+            self.session.sleep(0.5)
+        self.assertGreater(recorder.frames, 1)
+        self.assertEqual(sorted(os.listdir(directory)),
+                         sorted(os.path.basename(p) for p in recorder.paths))
+        self.assertEqual(len(recorder.paths), recorder.frames)
+        self.assertTrue(recorder.paths[0].endswith('frame-000000.png'))
+        shutil.rmtree(directory)
+
+    def test_record_failure(self):
+        directory = tempfile.mkdtemp()
+        recorder = self.session.record(directory, format='nosuchformat')
+        with self.assertRaises(Error):
+            with recorder:
+                self.session.open(base_url)
+        self.assertEqual(recorder.paths, [])
+        shutil.rmtree(directory)
+
+    def test_capture_region(self):
+        self.session.open("%secho/region" % base_url)
+        image = self.session.capture(region=(10, 10, 20, 30))
+        self.assertEqual((image.width(), image.height()), (10, 20))
+        self.assertEqual(image.pixel(5, 5) & 0xffffff, 0x333333)
+
+    def test_capture_thumbnail(self):
+        self.session.open(base_url)
+        size = self.session.capture().size()
+        image = self.session.capture(width=200)
+        self.assertEqual(image.width(), 200)
+        self.assertAlmostEqual(image.height(),
+                               size.height() * 200. / size.width(), delta=1)
+        image = self.session.capture(selector='h1', width=50)
+        self.assertEqual(image.width(), 50)
+
+    def test_capture_small_formats(self):
+        self.session.open("%secho/region" % base_url)
+        image = self.session.capture(region=(10, 10, 20, 30),
+                                     format=QImage.Format_RGB16)
+        self.assertEqual(image.format(), QImage.Format_RGB16)
+        self.assertLess(image.bytesPerLine(), image.width() * 4)
+        if hasattr(QImage, 'Format_Grayscale8'):
+            image = self.session.capture(region=(10, 10, 20, 30),
+                                         format=QImage.Format_Grayscale8)
+            self.assertEqual(image.format(), QImage.Format_Grayscale8)
+            self.assertEqual(image.pixel(5, 5) & 0xffffff, 0x333333)
+
+    def test_capture_selector_size(self):
+        self.session.open(base_url)
+        x1, y1, x2, y2 = self.session.region_for_selector('h1')
+        image = self.session.capture(selector='h1')
+        self.assertEqual((image.width(), image.height()),
+                         (x2 - x1, y2 - y1))
+
+    def test_capture_many(self):
+        self.session.open(base_url)
+        selectors = ['h1', 'form', '#list']
+        images = self.session.capture_many(selectors)
+        self.assertEqual(set(images), set(selectors))
+        for selector in selectors:
+            x1, y1, x2, y2 = self.session.region_for_selector(selector)
+            self.assertEqual(
+                (images[selector].width(), images[selector].height()),
+                (x2 - x1, y2 - y1),
+            )
+        self.assertEqual(images['h1'], self.session.capture(selector='h1'))
+        encoded = self.session.capture_many(['h1'], output='bytes')
+        self.assertTrue(encoded['h1'].startswith(b'\x89PNG'))
+
+    def test_capture_many_sparse(self):
+        self.session.set_content(
+            '<div id="top" style="width: 20px; height: 20px"></div>'
+            '<div style="height: 5000px"></div>'
+            '<div id="bottom" style="width: 20px; height: 20px"></div>')
+        rendered = []
+        render = self.session._render
+
+        def spy(x, y, width, height, *args, **kwargs):
+            rendered.append((width, height))
+            return render(x, y, width, height, *args, **kwargs)
+
+        self.session._render = spy
+        images = self.session.capture_many(['#top', '#bottom'])
+        del self.session._render
+        self.assertEqual(len(rendered), 2)
+        self.assertTrue(all(height < 5000 for width, height in rendered))
+        x1, y1, x2, y2 = self.session.region_for_selector('#bottom')
+        self.assertEqual(images['#bottom'].height(), y2 - y1)
+
+    def test_capture_tiles(self):
+        self.session.open(base_url)
+        viewport_size = self.session.page.viewportSize()
+        tiles = list(self.session.capture_tiles(tile_size=(300, 200)))
+        width = max(x + image.width() for x, y, image in tiles)
+        height = max(y + image.height() for x, y, image in tiles)
+        size = self.session.main_frame.contentsSize()
+        self.assertEqual((width, height), (size.width(), size.height()))
+        self.assertEqual(
+            sum(image.width() * image.height() for x, y, image in tiles),
+            width * height,
+        )
+        self.assertTrue(all(image.width() <= 300 and image.height() <= 200
+                            for x, y, image in tiles))
+        self.assertEqual(self.session.page.viewportSize(), viewport_size)
+
+    def test_capture_tiles_to(self):
+        self.session.open(base_url)
+        paths = self.session.capture_tiles_to('tile_{y}_{x}.png',
+                                              tile_size=(512, 512))
+        self.assertIn('tile_0_0.png', paths)
+        for path in paths:
+            self.assertTrue(os.path.isfile(path))
+            os.remove(path)
+
+    def test_capture_tiles_to_unwritable_path(self):
+        self.session.open(base_url)
+        path = os.path.join(tempfile.mkdtemp(), 'missing', 'tile_{y}_{x}.png')
+        self.assertRaises(Error, self.session.capture_tiles_to, path)
+
+    def test_capture_tiles_stitch_to(self):
+        try:
+            import numpy
+        except ImportError:
+            raise unittest.SkipTest('Requires numpy')
+
+        self.session.open(base_url)
+        path = os.path.join(tempfile.mkdtemp(), 'stitched.npy')
+        self.assertEqual(self.session.capture_tiles_to(
+            tile_size=(300, 200), stitch_to=path), [])
+        stitched = numpy.load(path)
+        tiles = list(self.session.capture_tiles(tile_size=(300, 200)))
+        self.assertEqual(stitched.shape, (
+            max(y + image.height() for x, y, image in tiles),
+            max(x + image.width() for x, y, image in tiles),
+            4,
+        ))
+        for x, y, image in tiles:
+            self.assertTrue(numpy.array_equal(
+                stitched[y:y + image.height(), x:x + image.width()],
+                image_to_array(image),
+            ))
+        shutil.rmtree(os.path.dirname(path))
+
     def test_region_for_selector(self):
         self.session.open(base_url)
         x1, y1, x2, y2 = self.session.region_for_selector('h1')
@@ -286,6 +668,70 @@ class GhostTest(GhostTestCase):
         self.assertTrue(os.path.isfile('test.png'))
         os.remove('test.png')
 
+    def test_query(self):
+        self.session.open(base_url)
+        self.assertIsNone(self.session.query('#missing'))
+        self.assertEqual(len(self.session.query_all('[name=radio]')), 2)
+
+        field = self.session.query('#text')
+        field.fill('Here is a sample text.')
+        value, resources = self.session.evaluate(
+            'document.getElementById("text").value')
+        self.assertEqual(value, 'Here is a sample text.')
+        self.assertEqual(field.attribute('type'), 'TEXT')
+        self.assertIsNone(field.attribute('missing'))
+        self.assertEqual(field.region, self.session.region_for_selector(
+            '#text'))
+
+        self.session.query('[name=multiple-checkbox]').fill('second choice')
+        value, resources = self.session.evaluate(
+            'document.getElementById("multiple-checkbox-second").checked')
+        self.assertTrue(value)
+
+        self.assertEqual(self.session.query('h1').text(), 'Ghost.py')
+
+    def test_query_fill_group(self):
+        self.session.set_content(
+            '<form>'
+            '<input type="radio" id="nameless" value="a" />'
+            '<input type="checkbox" name=\'say "hi"\' value="x" />'
+            '<input type="checkbox" name=\'say "hi"\' value="y" id="y" />'
+            '</form><form>'
+            '<input type="checkbox" name=\'say "hi"\' value="y" id="z" />'
+            '<input type="hidden" name="agree" value="0" />'
+            '<input type="checkbox" name="agree" value="1" id="agree" />'
+            '</form>')
+        self.session.query('#nameless').fill('a')
+        self.session.query('[type=checkbox]').fill('y')
+        self.session.query('#agree').fill(True)
+        value, resources = self.session.evaluate(
+            '[document.getElementById("nameless").checked,'
+            ' document.getElementById("y").checked,'
+            ' document.getElementById("z").checked,'
+            ' document.getElementById("agree").checked]')
+        self.assertEqual(value, [True, True, False, True])
+
+    def test_query_click(self):
+        self.session.open(base_url)
+        link = self.session.query('a[href="/echo/link"]')
+        page, resources = link.click(expect_loading=True)
+        self.assertEqual(page.url, "%secho/link" % base_url)
+
+    def test_query_stale(self):
+        self.session.open(base_url)
+        heading = self.session.query('h1')
+        self.assertFalse(heading.stale)
+        self.session.evaluate(
+            'document.querySelector("h1").parentNode.removeChild('
+            'document.querySelector("h1"));')
+        self.assertTrue(heading.stale)
+        self.assertRaises(StaleElementError, heading.text)
+
+        field = self.session.query('#text')
+        self.session.open(base_url)
+        self.assertTrue(field.stale)
+        self.assertRaises(StaleElementError, field.fill, 'value')
+
     def test_set_field_value_checkbox_true(self):
         self.session.open(base_url)
         self.session.set_field_value('[name=checkbox]', True)
@@ -489,5 +935,261 @@ class GhostTest(GhostTestCase):
             "%sstatic/blackhat.jpg" % base_url in url_loaded)
         session.exit()
 
+    @unittest.skipIf(sys.version_info < (3, 5), 'Requires python 3.5+')
+    def test_async_open_concurrently(self):
+        import asyncio
+        from ghost.ext.asyncio import AsyncSession
+
+        sessions = [AsyncSession(self.ghost.start()) for _ in range(2)]
+
+        # No async/await syntax, this module must parse on python 2.7/3.4
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        def gather(coroutines):
+            return loop.run_until_complete(asyncio.gather(*coroutines))
+
+        try:
+            loaded = gather([
+                sessions[0].open(base_url),
+                sessions[1].open("%secho/async" % base_url),
+            ])
+            gather([session.wait_for_selector('body')
+                    for session in sessions])
+            urls = [page.url for page, resources in loaded]
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+            for session in sessions:
+                session.exit()
+
+        self.assertEqual(urls, [base_url, "%secho/async" % base_url])
+
+    def test_open_many(self):
+        urls = [base_url, "%secho/1" % base_url, "%secho/2" % base_url]
+        loaded = {}
+        for url, page, resources in self.ghost.open_many(urls, sessions=2):
+            self.assertIsNotNone(page)
+            self.assertEqual(page.url, url)
+            loaded[url] = page.session.content
+        self.assertEqual(set(loaded), set(urls))
+        self.assertIn('Ghost.py', loaded[base_url])
+        self.assertIn('2', loaded["%secho/2" % base_url])
+
+    def test_open_many_timeout(self):
+        results = list(self.ghost.open_many([base_url], timeout=0))
+        self.assertEqual(len(results), 1)
+        self.assertIsNone(results[0][1])
+
+    @requires_spawn
+    def test_pool_map(self):
+        urls = ["%secho/%s" % (base_url, i) for i in range(4)]
+        with GhostPool(processes=2) as pool:
+            titles = pool.map(_pool_title, urls)
+        self.assertEqual([title.strip() for title in titles],
+                         ['0', '1', '2', '3'])
+
+    @requires_spawn
+    def test_pool_restarts_crashed_worker(self):
+        with GhostPool(processes=1) as pool:
+            job_id = pool.submit(_pool_crash)
+            self.assertRaises(Error, pool.result, job_id)
+            self.assertEqual(
+                pool.map(_pool_title, ["%secho/alive" % base_url])[0]
+                .strip(),
+                'alive',
+            )
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'Requires python 3.7+')
+    def test_import_does_not_load_qt_modules(self):
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import json, sys, ghost, ghost.test, ghost.bindings; '
+            'print(json.dumps(sorted(m for m in sys.modules '
+            'if m.startswith(ghost.bindings.BINDING_NAME + ".Qt"))))',
+        ])
+        self.assertEqual(json.loads(output.decode('utf-8')), [])
+
+    def test_submodule_attribute(self):
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import ghost; print(ghost.ghost.default_user_agent)',
+        ])
+        self.assertEqual(output.decode('utf-8').strip(), default_user_agent)
+
+    def test_star_import(self):
+        namespace = {}
+        exec('from ghost import *', namespace)
+        for name in ['Error', 'Ghost', 'GhostTestCase', 'Session',
+                     'TimeoutError']:
+            self.assertIn(name, namespace)
+        self.assertNotIn('sys', namespace)
+
+    def test_content_cache(self):
+        self.session.open(base_url)
+        content = self.session.content
+        generation, resources = self.session.evaluate(
+            'window.__ghost.generation()')
+        self.assertIsNotNone(generation)
+        self.assertIs(self.session.content, content)
+        self.session.evaluate(
+            'document.querySelector("h1").textContent = "changed";')
+        self.assertIn('changed', self.session.content)
+        self.session.evaluate(
+            'document.querySelector("h1").setAttribute("title", "tip");')
+        self.assertIn('title="tip"', self.session.content)
+        self.session.open("%secho/cache" % base_url)
+        self.assertNotIn('changed', self.session.content)
+
+    def test_text(self):
+        self.session.open(base_url)
+        text = self.session.text()
+        self.assertIn('Ghost.py', text)
+        self.assertNotIn('<h1', text)
+        self.assertEqual(self.session.text('h1').strip(), 'Ghost.py')
+        self.assertRaises(Error, self.session.text, '#missing')
+
+    def test_readable_text(self):
+        paragraph = '<p>%s</p>' % ('Main content sentence. ' * 5)
+        self.session.set_content(
+            '<nav><a href="#">Home</a><p>%s</p></nav>'
+            '<div id="content"><h2>Title</h2>%s%s</div>'
+            '<footer><p>Copyright notice of the website.</p></footer>'
+            % ('<a href="#">%s</a>' % ('Link ' * 10), paragraph, paragraph))
+        text = self.session.readable_text()
+        self.assertIn('Title', text)
+        self.assertIn('Main content sentence.', text)
+        self.assertNotIn('Home', text)
+        self.assertNotIn('Copyright', text)
+        self.session.set_content(
+            '<nav>Menu</nav><article>Article text</article>')
+        self.assertEqual(self.session.readable_text(), 'Article text')
+
+    def test_set_content(self):
+        page, resources = self.session.set_content(
+            '<h1>Invoice</h1><img src="static/blackhat.jpg">', base_url)
+        self.assertIsNone(page)
+        self.assertTrue(self.session.exists('h1'))
+        self.assertIn('%sstatic/blackhat.jpg' % base_url,
+                      [resource.url for resource in resources])
+
+    def test_print_many_to_pdf(self):
+        directory = tempfile.mkdtemp()
+        items = [
+            {'path': os.path.join(directory, 'page.pdf'), 'url': base_url},
+            {'path': os.path.join(directory, 'html.pdf'),
+             'html': '<h1>Invoice</h1>'},
+        ]
+        results = list(self.session.print_many_to_pdf(items))
+        self.assertEqual(results, [(item['path'], None) for item in items])
+        for path, _ in results:
+            with open(path, 'rb') as f:
+                self.assertTrue(f.read().startswith(b'%PDF'))
+        shutil.rmtree(directory)
+
+    def test_print_many_to_pdf_skips_failing_items(self):
+        directory = tempfile.mkdtemp()
+        broken = '%sbroken' % base_url
+        items = [
+            {'path': os.path.join(directory, 'broken.pdf'), 'url': broken},
+            {'path': os.path.join(directory, 'page.pdf'), 'url': base_url},
+        ]
+        open_page = self.session.open
+
+        def fake_open(address, **kwargs):
+            if address == broken:
+                raise Error('Unable to load page')
+            return open_page(address, **kwargs)
+
+        self.session.open = fake_open
+        self.addCleanup(delattr, self.session, 'open')
+        (broken_path, error), (path, success) = \
+            self.session.print_many_to_pdf(items)
+        self.assertIsInstance(error, Error)
+        self.assertFalse(os.path.exists(broken_path))
+        self.assertIsNone(success)
+        with open(path, 'rb') as f:
+            self.assertTrue(f.read().startswith(b'%PDF'))
+        shutil.rmtree(directory)
+
+    def test_webview_is_lazy(self):
+        self.assertIsNone(self.session._webview)
+        self.session.open(base_url)
+        self.session.capture()
+        self.assertIsNone(self.session._webview)
+        self.session.print_to_pdf('test.pdf')
+        self.assertIsNotNone(self.session._webview)
+        self.assertIs(self.session.webview.page(), self.session.page)
+        os.remove('test.pdf')
+
+    def test_startup_timings(self):
+        self.assertEqual(
+            set(self.ghost.startup_timings),
+            set(['display', 'qapplication', 'library_paths']),
+        )
+
+    @unittest.skipIf(find_executable('Xvfb') is None, 'Requires Xvfb')
+    @requires_spawn
+    def test_pool_with_display_pool(self):
+        with DisplayPool(size=1) as displays:
+            self.assertEqual(len(displays.displays), 1)
+            self.assertNotEqual(os.environ.get('DISPLAY'), displays.get(0))
+            with GhostPool(processes=2, displays=displays) as pool:
+                titles = pool.map(_pool_title, ["%secho/xvfb" % base_url])
+            self.assertEqual(titles[0].strip(), 'xvfb')
+
+    def test_reset(self):
+        self.session.open("%scookie" % base_url)
+        self.session.evaluate('localStorage.setItem("foo", "bar");')
+        self.session.set_viewport_size(300, 200)
+        self.session.popup_messages.append('message')
+        self.session.add_init_script('window.injected = true;')
+        self.session.add_data_handler('rows', lambda rows: None)
+        self.session.reset()
+        self.assertEqual(self.session.init_scripts, [])
+        self.assertEqual(self.session.bridge.handlers, {})
+        self.assertEqual(self.session.main_frame.url().toString(),
+                         'about:blank')
+        self.assertEqual(len(self.session.cookies), 0)
+        self.assertEqual(self.session.popup_messages, [])
+        self.assertEqual(self.session.http_resources, [])
+        self.assertEqual(self.session.page.viewportSize().width(), 800)
+        self.session.open(base_url)
+        value, resources = self.session.evaluate(
+            'localStorage.getItem("foo")')
+        self.assertIsNone(value)
+        self.assertFalse(self.session.global_exists('injected'))
+
+    def test_session_pool(self):
+        pool = SessionPool(self.ghost, size=1)
+        with pool.session() as session:
+            session.open("%scookie" % base_url)
+            self.assertEqual(len(session.cookies), 1)
+        with pool.session() as reused:
+            self.assertIs(reused, session)
+            self.assertEqual(len(reused.cookies), 0)
+            other = pool.acquire()
+            self.assertIsNot(other, reused)
+            pool.release(other)
+        pool.close()
+
+
+class ReusedSessionGhostTest(GhostTestCase):
+    port = PORT
+    reuse_sessions = True
+
+    @classmethod
+    def create_app(cls):
+        return app
+
+    def test_open(self):
+        page, resources = self.session.open(base_url)
+        self.assertEqual(page.url, base_url)
+
+    def test_reused_session_is_blank(self):
+        self.assertEqual(self.session.http_resources, [])
+        self.assertIn(self.session.main_frame.url().toString(),
+                      ('', 'about:blank'))
+
 if __name__ == '__main__':
     unittest.main()